@@ -0,0 +1,213 @@
+"""
+Benchmark de velocidad y calidad de las estrategias de imputación (Melbourne Housing).
+
+- Carga data/melb_data.csv y lo replica a varias escalas (1x, 10x, 100x)
+- Oculta valores conocidos a tasas controladas (mask-and-recover): se eligen filas
+  del dataset base y se ocultan en todas sus réplicas, para que ninguna copia
+  delate el valor real
+- Ejecuta cada estrategia en paralelo (un proceso por combinación) para medir
+  exactitud y memoria: simple, por grupos (impute_df), jerárquica y KNN espacial
+- Reporta tiempo de pared (medido en serie, un caso a la vez, para que no dependa
+  de cuántos procesos comparten los núcleos), memoria pico (tracemalloc) y
+  error de recuperación (MAE en numéricas, exactitud de moda en categóricas).
+  A escalas >1 las réplicas de un mismo vecino cuentan como vecinos distintos,
+  por lo que KNN pierde diversidad: comparar su exactitud dentro de una escala
+- Guarda el resultado en JSON (por defecto models/melb_impute_bench.json) para
+  detectar regresiones de velocidad y de exactitud
+- Con --replay reproduce el dataset por fecha en lotes con MelbImputer.partial_fit
+  y reporta la deriva frente al recálculo exacto (drift_report)
+
+Ejecutar desde la raíz del proyecto:
+
+    python bench_impute_melb.py
+    python bench_impute_melb.py --scales 1 10 --rates 0.1 --workers 1
+    python bench_impute_melb.py --replay --batch 1000
+"""
+
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from imputer_melb import MelbImputer
+from utils_melb import (
+    SPATIAL_COLS, dataset_version, impute_df, impute_hierarchical, load_raw,
+)
+
+DATA_PATH = Path("data") / "melb_data.csv"
+OUT_PATH = Path("models") / "melb_impute_bench.json"
+
+NUM_TARGETS = ["BuildingArea", "YearBuilt", "Landsize", "Car"]
+CAT_TARGETS = ["CouncilArea"]
+
+
+# ============================
+# 1. Estrategias
+# ============================
+
+def impute_simple(df: pd.DataFrame) -> pd.DataFrame:
+    """Línea base: mediana global (numéricas) y moda global (categóricas)."""
+    out = df.copy(deep=False)
+    for col in NUM_TARGETS:
+        out[col] = out[col].fillna(out[col].median())
+    for col in CAT_TARGETS:
+        out[col] = out[col].fillna(out[col].mode(dropna=True).iloc[0])
+    return out
+
+
+# grupo_suburb y knn_espacial sin el respaldo jerárquico final de impute_df: se mide
+# la regla pura, no una mezcla con la estrategia "jerarquica"
+STRATEGIES = {
+    "simple": impute_simple,
+    "grupo_suburb": lambda df: impute_df(df, fallback=False),
+    "jerarquica": lambda df: impute_hierarchical(df)[0],
+    "knn_espacial": lambda df: impute_df(df, knn_cols=SPATIAL_COLS, fallback=False),
+}
+
+
+# ============================
+# 2. Datos enmascarados
+# ============================
+
+def masked_dataset(scale: int, rate: float, seed: int = 42):
+    """Réplica `scale` veces del dataset con `rate` de los valores conocidos ocultos.
+
+    Devuelve (df enmascarado, df original, {columna: posiciones ocultas}).
+    """
+    base = load_raw(str(DATA_PATH))
+    rng = np.random.default_rng(seed)
+    n = len(base)
+    hidden_base = {}
+    for col in NUM_TARGETS + CAT_TARGETS:
+        known = np.flatnonzero(base[col].notna().to_numpy())
+        hidden_base[col] = rng.choice(known, int(len(known) * rate), replace=False)
+    truth = pd.concat([base] * scale, ignore_index=True)
+    masked = truth.copy()
+    hidden = {}
+    for col, rows in hidden_base.items():
+        hidden[col] = (rows[None, :] + n * np.arange(scale)[:, None]).ravel()
+        masked.loc[hidden[col], col] = np.nan
+    return masked, truth, hidden
+
+
+def recovery_metrics(imputed: pd.DataFrame, truth: pd.DataFrame, hidden: dict) -> dict:
+    metrics = {}
+    for col, rows in hidden.items():
+        got = imputed[col].iloc[rows]
+        real = truth[col].iloc[rows]
+        recovered = float(got.notna().mean())
+        if col in NUM_TARGETS:
+            err = (got.astype("float64") - real.astype("float64")).abs()
+            metrics[col] = {"mae": float(err.mean()), "recuperado": recovered}
+        else:
+            hit = got.astype(object).to_numpy() == real.astype(object).to_numpy()
+            metrics[col] = {"exactitud_moda": float(hit.mean()), "recuperado": recovered}
+    return metrics
+
+
+def run_case(case: tuple) -> dict:
+    """Worker: ejecuta una estrategia sobre una escala/tasa y mide memoria y error."""
+    strategy, scale, rate = case
+    masked, truth, hidden = masked_dataset(scale, rate)
+    tracemalloc.start()
+    imputed = STRATEGIES[strategy](masked)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "estrategia": strategy,
+        "escala": scale,
+        "filas": len(masked),
+        "tasa_oculta": rate,
+        "memoria_pico_mb": round(peak / 1e6, 2),
+        "metricas": recovery_metrics(imputed, truth, hidden),
+    }
+
+
+def time_case(case: tuple) -> float:
+    """Tiempo de pared de una estrategia; se llama en serie, sin otros casos compitiendo por CPU."""
+    strategy, scale, rate = case
+    masked, _, _ = masked_dataset(scale, rate)
+    t0 = time.perf_counter()
+    STRATEGIES[strategy](masked)
+    return time.perf_counter() - t0
+
+
+def replay_incremental(batch: int = 1000) -> pd.DataFrame:
+    """Ajusta con el primer lote (por fecha) y agrega el resto con partial_fit.
+
+    Cada lote se imputa antes de incorporarlo (como llegaría un lote semanal nuevo),
+    de modo que un patrón de faltantes que no estaba en los lotes anteriores también
+    debe quedar cubierto. Devuelve el drift_report frente al historial completo;
+    falla si algún lote no se puede incorporar o si quedan valores sin imputar.
+    """
+    df = load_raw(str(DATA_PATH)).sort_values("Date", kind="stable", ignore_index=True)
+    imp = MelbImputer(incremental=True).fit(df.iloc[:batch])
+    left = pd.Series(0, index=df.columns)
+    for start in range(batch, len(df), batch):
+        chunk = df.iloc[start:start + batch]
+        left = left.add(imp.transform(chunk).isna().sum(), fill_value=0)
+        imp.partial_fit(chunk)
+    left = left.add(imp.transform(df).isna().sum(), fill_value=0)
+    if left.any():
+        raise AssertionError(f"Quedaron faltantes tras el replay: {left[left > 0].to_dict()}")
+    return imp.drift_report(df)
+
+
+# ============================
+# 3. Ejecución
+# ============================
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--rates", type=float, nargs="+", default=[0.1, 0.3])
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), choices=list(STRATEGIES))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", type=Path, default=OUT_PATH)
+    parser.add_argument("--replay", action="store_true",
+                        help="solo reproducir el dataset en lotes con partial_fit y reportar la deriva")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.replay:
+        print(replay_incremental(args.batch).to_string(index=False))
+        return
+
+    load_raw(str(DATA_PATH))  # genera el snapshot antes de lanzar los workers
+    cases = [(s, k, r) for k in args.scales for r in args.rates for s in args.strategies]
+    print(f"Exactitud y memoria de {len(cases)} casos con {args.workers} procesos...")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(run_case, cases))
+    # los tiempos del historial se miden en serie: con el pool dependerían de cuántos
+    # casos corren a la vez
+    for case, res in zip(cases, results):
+        res["segundos"] = round(time_case(case), 4)
+        print(f"{res['estrategia']:>13} x{res['escala']:<4} oculto={res['tasa_oculta']:.0%} "
+              f"-> {res['segundos']:.3f}s, {res['memoria_pico_mb']:.0f} MB")
+
+    args.out.parent.mkdir(exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "dataset": str(DATA_PATH),
+                "version_datos": dataset_version(str(DATA_PATH)),
+                "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "procesos": args.workers,  # solo para exactitud y memoria; tiempos en serie
+                "resultados": results,
+            },
+            f,
+            indent=4,
+            ensure_ascii=False,
+        )
+    print(f"Resultados guardados en: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
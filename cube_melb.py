@@ -0,0 +1,309 @@
+"""
+Cubos preagregados del dataset Melbourne Housing.
+
+Cubo temporal: precio por período (mensual y semanal) × Regionname × Type con
+conteo, suma, media, mediana y ventana móvil. Se calculan todos los conjuntos de
+agrupación (con "Todas" como margen), de modo que cualquier vista temporal es un
+filtro sobre una tabla pequeña y no un nuevo recorrido de los datos.
+
+Cubo OLAP: cuboides por subconjuntos de Suburb × Regionname × CouncilArea × Type ×
+Method × Rooms × mes con conteos, sumas e histogramas dispersos de log10(precio) y
+log10(precio/m²) sobre una grilla fija. Cada consulta usa el cuboide más chico que
+cubre sus dimensiones; los histogramas se suman al agregar celdas, así que las
+medianas de cualquier corte salen del histograma acumulado sin volver a las filas.
+
+Ambos cubos se guardan por versión del CSV en data/.cache.
+"""
+
+import json
+from itertools import combinations
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils_melb import cache_dir, cache_key, cached_artifact, load_raw
+
+# Subir la versión cuando cambie la definición del cubo invalida los guardados.
+CUBE_VERSION = 1
+
+TIME_FREQS = {"mensual": "M", "semanal": "W"}
+TIME_DIMS = ["Regionname", "Type"]
+ROLLING_WINDOWS = {"mensual": 3, "semanal": 4}  # períodos de la ventana móvil
+ALL = "Todas"
+
+
+def _rolling_sum(a: np.ndarray, w: int) -> np.ndarray:
+    """Suma móvil de ancho w por fila (series × períodos) con sumas acumuladas."""
+    cs = np.cumsum(a, axis=1)
+    out = cs.copy()
+    out[:, w:] -= cs[:, :-w]
+    return out
+
+
+def time_cube(df: pd.DataFrame, value: str = "Price", dims=TIME_DIMS) -> pd.DataFrame:
+    """Cubo temporal en formato largo.
+
+    Columnas: frecuencia, periodo (inicio del período), una por dimensión (ALL en
+    los márgenes), n, suma, media, mediana, n_movil y media_movil. Cada serie
+    cubre todos los períodos entre la primera y la última fecha (n = 0 en los
+    huecos) para que la ventana móvil sea temporal y no por filas.
+    """
+    d = df.loc[df[value].notna() & df["Date"].notna(), ["Date", value, *dims]]
+    parts = []
+    for name, freq in TIME_FREQS.items():
+        periodo = d["Date"].dt.to_period(freq)
+        periods = pd.period_range(periodo.min(), periodo.max(), freq=freq)
+        full = pd.DataFrame({"periodo": periods.start_time})
+        keyed = d.assign(periodo=periodo.dt.start_time)
+        for k in range(len(dims) + 1):
+            for combo in map(list, combinations(dims, k)):
+                g = (keyed.groupby(["periodo", *combo], observed=True)[value]
+                     .agg(n="count", suma="sum", mediana="median").reset_index())
+                series = g[combo].drop_duplicates() if combo else pd.DataFrame(index=[0])
+                grid = series.merge(full, how="cross").merge(g, on=["periodo", *combo], how="left")
+                cnt = grid["n"].fillna(0).to_numpy().reshape(-1, len(full))
+                tot = grid["suma"].fillna(0).to_numpy(dtype="float64").reshape(-1, len(full))
+                w = ROLLING_WINDOWS[name]
+                rc, rs = _rolling_sum(cnt, w), _rolling_sum(tot, w)
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    grid["media"] = np.where(cnt > 0, tot / cnt, np.nan).ravel()
+                    grid["media_movil"] = np.where(rc > 0, rs / rc, np.nan).ravel()
+                grid["n"] = cnt.ravel().astype(np.int64)
+                grid["suma"] = tot.ravel()
+                grid["n_movil"] = rc.ravel().astype(np.int64)
+                for c in dims:
+                    grid[c] = grid[c].astype(object) if c in combo else ALL
+                parts.append(grid.assign(frecuencia=name))
+    cols = ["frecuencia", "periodo", *dims, "n", "suma", "media", "mediana", "n_movil", "media_movil"]
+    out = pd.concat(parts, ignore_index=True)[cols]
+    for c in ["frecuencia", *dims]:
+        out[c] = out[c].astype("category")
+    return out
+
+
+def time_slice(cube: pd.DataFrame, freq: str = "mensual", **filters) -> pd.DataFrame:
+    """Serie del cubo para una frecuencia; las dimensiones no indicadas quedan en ALL."""
+    mask = cube["frecuencia"] == freq
+    for c in TIME_DIMS:
+        mask &= cube[c] == filters.get(c, ALL)
+    return cube[mask].sort_values("periodo", ignore_index=True)
+
+
+def time_cube_path(path: str) -> Path:
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.timecube.v{CUBE_VERSION}.arrow"
+
+
+def get_time_cube(path: str) -> pd.DataFrame:
+    """time_cube(load_raw(path)) guardado por versión del CSV (disco + memoria del proceso)."""
+    return cached_artifact(time_cube_path(path), lambda: time_cube(load_raw(path)), pd.read_feather,
+                           lambda cube, tmp: cube.to_feather(tmp),
+                           stale=f"{Path(path).stem}.*.timecube.*.arrow")
+
+
+# ============================
+# Cubo OLAP
+# ============================
+
+OLAP_DIMS = ["Suburb", "Regionname", "CouncilArea", "Type", "Method", "Rooms", "Año", "Mes"]
+OLAP_CATEGORIES = ["Suburb", "Regionname", "CouncilArea", "Type", "Method"]
+# conjuntos de agrupación precalculados; el último (todas las dimensiones) responde cualquier corte
+OLAP_CUBOIDS = [
+    ["Regionname", "Type", "Rooms", "Año"],
+    ["Regionname", "CouncilArea", "Type", "Rooms", "Año"],
+    ["Regionname", "CouncilArea", "Type", "Method", "Rooms", "Año"],
+    ["Regionname", "Type", "Method", "Rooms", "Año", "Mes"],
+    ["Suburb", "Regionname", "CouncilArea", "Type", "Rooms", "Año"],
+    OLAP_DIMS,
+]
+# Subir la versión cuando cambien los cuboides o el formato invalida los guardados.
+OLAP_VERSION = 2
+MISSING_LABEL = "Sin dato"
+# grilla fija de log10: 10 mil a 100 millones AUD; 100 a 1 millón AUD/m²
+PRICE_LOG_RANGE = (4.0, 8.0)
+M2_LOG_RANGE = (2.0, 6.0)
+HIST_BINS = 128
+
+
+def _log_bins(values: np.ndarray, log_range) -> np.ndarray:
+    """Índice de bin de log10(valor) en la grilla fija (los extremos se acumulan en los bordes)."""
+    lo, hi = log_range
+    with np.errstate(divide="ignore", invalid="ignore"):
+        b = np.floor((np.log10(values) - lo) / (hi - lo) * HIST_BINS)
+    return np.clip(b, 0, HIST_BINS - 1).astype(np.int64)
+
+
+def _sparse_hist(codes: np.ndarray, values: np.ndarray, log_range):
+    """Histograma disperso por celda: (clave celda*HIST_BINS + bin, conteo) de los bins no vacíos."""
+    ok = np.isfinite(values) & (values > 0)
+    keys, counts = np.unique(codes[ok] * HIST_BINS + _log_bins(values[ok], log_range), return_counts=True)
+    return keys.astype(np.int32), counts.astype(np.uint32)
+
+
+def _sum_hists(cell_group: np.ndarray, keys: np.ndarray, counts: np.ndarray):
+    """Histogramas dispersos por grupo de las celdas con grupo >= 0: (clave grupo*HIST_BINS + bin, conteo)."""
+    g = cell_group[keys // HIST_BINS]
+    ok = g >= 0
+    merged, inverse = np.unique(g[ok] * HIST_BINS + keys[ok] % HIST_BINS, return_inverse=True)
+    return merged, np.bincount(inverse, weights=counts[ok], minlength=len(merged))
+
+
+def _sorted_codes(col: pd.Series):
+    """(códigos en orden de valores, cantidad de valores) de una dimensión de las celdas."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        return col.cat.codes.to_numpy(), len(col.cat.categories)
+    codes, uniques = pd.factorize(col.to_numpy(), sort=True)
+    return codes, len(uniques)
+
+
+def hist_median(keys: np.ndarray, counts: np.ndarray, ngroups: int, log_range) -> np.ndarray:
+    """Mediana por grupo de histogramas dispersos de log10 (interpolación lineal dentro del bin).
+
+    `keys` (grupo*HIST_BINS + bin) viene ordenada, como la devuelve _sum_hists.
+    """
+    lo, hi = log_range
+    width = (hi - lo) / HIST_BINS
+    group = keys // HIST_BINS
+    half = np.bincount(group, weights=counts, minlength=ngroups) / 2
+    cum = np.cumsum(counts, dtype="float64")
+    start = np.searchsorted(group, group)
+    cum -= cum[start] - counts[start]  # acumulado dentro de cada grupo
+    # primer bin de cada grupo cuyo acumulado alcanza la mitad
+    reached = np.flatnonzero(cum >= half[group])
+    first = reached[np.r_[True, group[reached][1:] != group[reached][:-1]]] if len(reached) else reached
+    out = np.full(ngroups, np.nan)
+    before = cum[first] - counts[first]
+    out[group[first]] = 10 ** (lo + (keys[first] % HIST_BINS + (half[group[first]] - before) / counts[first]) * width)
+    return out
+
+
+class OlapCube:
+    """Cuboides preagregados (conjuntos de agrupación de OLAP_CUBOIDS) con histogramas log dispersos.
+
+    Cada cuboide guarda sus celdas (dimensiones + conteos y sumas) y, por histograma,
+    solo los bins no vacíos como pares (celda*HIST_BINS + bin, conteo). `query` usa
+    el cuboide más chico que contiene las dimensiones pedidas y filtradas: conteos
+    y sumas se suman, y las medianas salen de los histogramas sumados (error menor
+    al ancho de un bin, ~7% en la grilla por defecto).
+    """
+
+    def __init__(self, cuboids: list):
+        # [(dims, celdas, (claves, conteos) de precio, (claves, conteos) de precio/m²)]
+        self.cuboids = sorted(cuboids, key=lambda c: len(c[1]))
+        self.cells = max(self.cuboids, key=lambda c: len(c[0]))[1]
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, cuboids=OLAP_CUBOIDS) -> "OlapCube":
+        d = df.loc[df["Price"].notna() & df["Date"].notna()]
+        keys = pd.DataFrame(index=d.index)
+        for c in OLAP_CATEGORIES:
+            keys[c] = d[c].astype(object).fillna(MISSING_LABEL)
+        keys["Rooms"] = d["Rooms"].astype("int64")
+        keys["Mes"] = d["Date"].dt.to_period("M").dt.start_time
+        keys["Año"] = keys["Mes"].dt.year.astype("int16")
+        price = d["Price"].to_numpy(dtype="float64", na_value=np.nan)
+        area = d["BuildingArea"].to_numpy(dtype="float64", na_value=np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            m2 = np.where(area > 0, price / area, np.nan)
+        has_m2 = np.isfinite(m2)
+        built = []
+        for dims in map(list, cuboids):
+            codes, uniques = pd.MultiIndex.from_frame(keys[dims]).factorize()
+            ncells = len(uniques)
+            cells = pd.MultiIndex.from_tuples(uniques, names=dims).to_frame(index=False)
+            cells["n"] = np.bincount(codes, minlength=ncells).astype(np.int64)
+            cells["suma_precio"] = np.bincount(codes, weights=price, minlength=ncells)
+            cells["n_m2"] = np.bincount(codes[has_m2], minlength=ncells).astype(np.int64)
+            cells["suma_precio_m2"] = np.bincount(codes[has_m2], weights=m2[has_m2], minlength=ncells)
+            for c in OLAP_CATEGORIES:
+                if c in dims:
+                    cells[c] = cells[c].astype("category")
+            cells = cells.astype({c: t for c, t in [("Rooms", "int8"), ("Año", "int16")] if c in dims})
+            built.append((dims, cells, _sparse_hist(codes, price, PRICE_LOG_RANGE),
+                          _sparse_hist(codes, m2, M2_LOG_RANGE)))
+        return cls(built)
+
+    def values(self, dim: str) -> list:
+        """Valores disponibles de una dimensión (para los filtros de la página)."""
+        return sorted(self.cells[dim].dropna().unique().tolist())
+
+    def cuboid_for(self, dims) -> int:
+        """Índice del cuboide más chico que contiene todas las dimensiones `dims`."""
+        need = set(dims)
+        return next(i for i, (cdims, *_) in enumerate(self.cuboids) if need <= set(cdims))
+
+    def query(self, by=(), **filters) -> pd.DataFrame:
+        """Agrega las celdas que cumplen los filtros ({dimensión: valores}) por `by`."""
+        by = list(by)
+        filters = {dim: list(v) for dim, v in filters.items() if v is not None and len(v)}
+        _, cells, hp, hm = self.cuboids[self.cuboid_for(by + list(filters))]
+        mask = np.ones(len(cells), dtype=bool)
+        for dim, values in filters.items():
+            mask &= cells[dim].isin(values).to_numpy()
+        sub = cells[mask] if len(filters) else cells
+        if by:
+            # clave entera por combinación de códigos ordenados en vez de un groupby de pandas
+            parts = [_sorted_codes(sub[c]) for c in by]
+            key = np.ravel_multi_index([codes for codes, _ in parts], [max(n, 1) for _, n in parts])
+            _, first, codes = np.unique(key, return_index=True, return_inverse=True)
+            columns = {c: sub[c].array.take(first) for c in by}
+        else:
+            codes = np.zeros(len(sub), dtype=np.int64)
+            first, columns = [0], {}
+        g = len(first)
+        cell_group = np.full(len(cells), -1, dtype=np.int64)
+        cell_group[mask] = codes
+        sums = {c: np.bincount(codes, weights=sub[c].to_numpy(dtype="float64"), minlength=g)
+                for c in ["n", "suma_precio", "n_m2", "suma_precio_m2"]}
+        with np.errstate(invalid="ignore", divide="ignore"):
+            columns["n"] = sums["n"].astype(np.int64)
+            columns["precio_medio"] = sums["suma_precio"] / sums["n"]
+            columns["precio_mediano"] = hist_median(*_sum_hists(cell_group, *hp), g, PRICE_LOG_RANGE)
+            columns["n_m2"] = sums["n_m2"].astype(np.int64)
+            columns["precio_m2_medio"] = sums["suma_precio_m2"] / sums["n_m2"]
+            columns["precio_m2_mediano"] = hist_median(*_sum_hists(cell_group, *hm), g, M2_LOG_RANGE)
+        out = pd.DataFrame(columns)
+        return out
+
+    def save(self, target: Path) -> None:
+        # categóricas como códigos; sus categorías van en el meta JSON
+        arrays, categories = {}, {}
+        for i, (dims, cells, hp, hm) in enumerate(self.cuboids):
+            for c in cells.columns:
+                if isinstance(cells[c].dtype, pd.CategoricalDtype):
+                    categories[f"{i}_{c}"] = cells[c].cat.categories.tolist()
+                    arrays[f"{i}_c_{c}"] = cells[c].cat.codes.to_numpy()
+                else:
+                    arrays[f"{i}_c_{c}"] = cells[c].to_numpy()
+            arrays[f"{i}_hp_keys"], arrays[f"{i}_hp_counts"] = hp
+            arrays[f"{i}_hm_keys"], arrays[f"{i}_hm_counts"] = hm
+        meta = {"cuboids": [[*dims] for dims, *_ in self.cuboids], "categories": categories}
+        np.savez(target, meta=np.array(json.dumps(meta)), **arrays)
+
+    @classmethod
+    def load(cls, target: Path) -> "OlapCube":
+        with np.load(target) as z:
+            built = []
+            meta = json.loads(str(z["meta"]))
+            for i, dims in enumerate(meta["cuboids"]):
+                prefix = f"{i}_c_"
+                cells = pd.DataFrame({k[len(prefix):]: z[k] for k in z.files if k.startswith(prefix)})
+                for c in dims:
+                    if f"{i}_{c}" in meta["categories"]:
+                        cells[c] = pd.Categorical.from_codes(cells[c], meta["categories"][f"{i}_{c}"])
+                built.append((dims, cells, (z[f"{i}_hp_keys"], z[f"{i}_hp_counts"]),
+                              (z[f"{i}_hm_keys"], z[f"{i}_hm_counts"])))
+            return cls(built)
+
+
+def olap_cube_path(path: str) -> Path:
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.olap.v{OLAP_VERSION}.npz"
+
+
+def get_olap_cube(path: str) -> OlapCube:
+    """OlapCube de load_raw(path) guardado por versión del CSV (disco + memoria del proceso)."""
+    return cached_artifact(olap_cube_path(path), lambda: OlapCube.build(load_raw(path)),
+                           OlapCube.load, OlapCube.save,
+                           stale=f"{Path(path).stem}.*.olap.*")
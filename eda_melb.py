@@ -0,0 +1,167 @@
+"""
+Artefactos precalculados del análisis exploratorio (Melbourne Housing).
+
+`build_eda_artifacts` calcula una sola vez por versión del CSV todo lo que muestra
+la página 2 (duplicados, faltantes, describe, outliers por regla, histogramas, densidad 2D
+para dispersión, correlaciones, tendencia anual y pruebas estadísticas) y lo guarda
+como un paquete JSON compacto en data/.cache. La página solo renderiza desde ese
+paquete: el tiempo de cada rerun no crece con el tamaño de los datos. Si el paquete
+falta, la página lo construye en serie; conviene generarlo antes con este script,
+que reparte el bootstrap entre todos los CPU.
+
+Ejecutar desde la raíz del proyecto (opcional; la página lo genera si falta):
+
+    python eda_melb.py
+    python eda_melb.py --force
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils_melb import (
+    OUTLIER_RULES, OutlierIndex, StreamingProfile, cache_dir, cache_key, cached_artifact, dataset_version,
+    get_dedup_index, load_raw, missing_table, save_artifact, schema_memory_report,
+)
+from features_melb import with_features
+from stats_melb import bootstrap_tests, corr_pair, correlations, get_correlations
+from viz_melb import BIN_SCALES, SCATTER_WEBGL_MAX, bin_2d, bin_counts
+
+DATA_PATH = Path("data") / "melb_data.csv"
+
+# Subir la versión cuando cambie el contenido del paquete invalida los anteriores.
+EDA_VERSION = 9
+
+HIST_COLS = ["Price", "Rooms", "Distance", "Landsize", "BuildingArea", "Bedroom2", "Bathroom", "Car"]
+HIST_BINS = 30
+SCATTER_COLS = ["Rooms", "Distance", "Landsize", "BuildingArea"]
+SEED = 42
+NEAR_DUP_COLS = ["Address", "Suburb", "Date", "Price", "SellerG", "Method", "Rooms", "Type"]
+NEAR_DUP_SAMPLE = 20  # grupos de posibles duplicados incluidos en el paquete
+
+
+def _frame_to_json(df: pd.DataFrame) -> dict:
+    return json.loads(df.to_json(orient="split", date_format="iso"))
+
+
+def frame(bundle: dict, key: str) -> pd.DataFrame:
+    """Reconstruye un DataFrame guardado en el paquete."""
+    return pd.DataFrame(**bundle[key])
+
+
+def artifacts_path(path: str) -> Path:
+    """Ruta del paquete EDA para la versión actual del CSV."""
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.eda.v{EDA_VERSION}.json"
+
+
+def _histograms(df: pd.DataFrame, cols, bins: int) -> dict:
+    """{columna: {escala: bin_counts}} para las tres escalas de viz_melb."""
+    return {col: {scale: bin_counts(df[col], bins, scale) for scale in BIN_SCALES}
+            for col in cols if df[col].notna().any()}
+
+
+def _stat_tests(df: pd.DataFrame, corr: dict, n_jobs: int = 1) -> dict:
+    """Pruebas de la sección 2.10 con IC bootstrap (stats_melb.bootstrap_tests)."""
+    tests = bootstrap_tests(df, n_jobs=n_jobs, seed=SEED)
+    # el rho puntual Price–Distance sale de la misma matriz que el mapa de calor
+    sp = corr_pair(corr, "Price", "Distance", "spearman")
+    tests["spearman"].update(rho=sp["r"], pvalue=sp["pvalue"], n=sp["n"])
+    return tests
+
+
+def build_eda_artifacts(path: str = str(DATA_PATH), write: bool = True, n_jobs: int = 1) -> dict:
+    """Calcula el paquete EDA de `path` y (por defecto) lo guarda en la caché.
+
+    `n_jobs` > 1 reparte el bootstrap en procesos; la página construye en serie.
+    """
+    raw = load_raw(path)
+    dedup = get_dedup_index(path)
+    duplicated = dedup.duplicated()
+    duplicates = int(duplicated.sum())
+    df = raw[~duplicated] if duplicates else raw
+    near = dedup.near_duplicates()
+    near_rows = raw.iloc[near["fila"].to_numpy()][NEAR_DUP_COLS].assign(grupo=near["grupo"].to_numpy())
+
+    feats = with_features(df[["Price", "BuildingArea"]], path)
+
+    profile = StreamingProfile().update(df)
+    outliers = {rule: OutlierIndex.build(df, rule=rule) for rule in OUTLIER_RULES}
+    num_cols = list(df.select_dtypes("number").columns)
+    corr = correlations(df, num_cols) if duplicates else get_correlations(path, num_cols)
+    years = df["Year"] if "Year" in df.columns else df["Date"].dt.year.rename("Year")
+    trend = df["Price"].groupby(years).mean().dropna().rename_axis("Year").reset_index()
+
+    scatter_cols = [c for c in SCATTER_COLS if c in df.columns]
+    scatter_out = {c: outliers["iqr"].mask([c, "Price"]) for c in scatter_cols}
+
+    bundle = {
+        "eda_version": EDA_VERSION,
+        "dataset_version": dataset_version(path),
+        "rows": int(raw.shape[0]),
+        "cols": int(raw.shape[1]),
+        "dtypes": raw.dtypes.astype(str).to_dict(),
+        "schema_memory": _frame_to_json(schema_memory_report(path)),
+        "duplicates": duplicates,
+        "near_duplicates": {"filas": int(len(near)), "grupos": int(near["grupo"].nunique()),
+                            "muestra": _frame_to_json(near_rows[near_rows["grupo"] < NEAR_DUP_SAMPLE])},
+        "missing": _frame_to_json(missing_table(df)),
+        "features_head": _frame_to_json(feats[["Price", "BuildingArea", "Price_m2", "Age", "Density"]].head()),
+        "describe": _frame_to_json(profile.describe()),
+        "outliers": {rule: _frame_to_json(idx.table()) for rule, idx in outliers.items()},
+        "histograms": _histograms(df, [c for c in HIST_COLS if c in df.columns], HIST_BINS),
+        # densidad 2D siempre (con y sin outliers IQR de la variable o de Price);
+        # los puntos solo si el marco es pequeño para WebGL
+        "density": {c: bin_2d(df[c], df["Price"]) for c in scatter_cols},
+        "density_sin_outliers": {c: bin_2d(df[c][~out], df["Price"][~out])
+                                 for c, out in scatter_out.items()},
+        "corr": {k: _frame_to_json(v) for k, v in corr.items()},
+        "year_trend": _frame_to_json(trend),
+        "tests": _stat_tests(df, corr, n_jobs),
+    }
+    if len(df) <= SCATTER_WEBGL_MAX:
+        bundle["scatter"] = _frame_to_json(df[["Price"] + scatter_cols].reset_index(drop=True))
+        bundle["scatter_outliers"] = {c: np.flatnonzero(out).tolist() for c, out in scatter_out.items()}
+    if write:
+        save_artifact(bundle, artifacts_path(path), _write_bundle, stale=f"{Path(path).stem}.*.eda.v*.json")
+    return bundle
+
+
+def _write_bundle(bundle: dict, target: Path) -> None:
+    target.write_text(json.dumps(bundle, ensure_ascii=False), encoding="utf-8")
+
+
+def _read_bundle(target: Path) -> dict:
+    return json.loads(target.read_text(encoding="utf-8"))
+
+
+def load_eda_artifacts(path: str = str(DATA_PATH)) -> dict:
+    """Paquete EDA de la versión actual del CSV; se construye solo si no existe."""
+    return cached_artifact(artifacts_path(path), lambda: build_eda_artifacts(path, write=False),
+                           _read_bundle, _write_bundle, stale=f"{Path(path).stem}.*.eda.v*.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", nargs="?", default=str(DATA_PATH))
+    parser.add_argument("--force", action="store_true", help="recalcular aunque exista el paquete")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1,
+                        help="procesos para el bootstrap (por defecto, todos los CPU)")
+    args = parser.parse_args()
+    target = artifacts_path(args.path)
+    if target.exists() and not args.force:
+        print(f"Paquete EDA al día: {target}")
+        return
+    build_eda_artifacts(args.path, n_jobs=args.jobs)
+    if target.exists():
+        print(f"Paquete EDA guardado en: {target} ({target.stat().st_size / 1e3:.0f} KB)")
+    else:
+        print(f"No se pudo escribir la caché en {target.parent}; el paquete se recalculará en cada proceso.")
+
+
+if __name__ == "__main__":
+    main()
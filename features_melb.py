@@ -0,0 +1,113 @@
+"""
+Variables derivadas del dataset Melbourne Housing (feature store).
+
+Cada variable se declara en FEATURES con sus columnas de entrada y una función
+vectorizada sobre arreglos NumPy. `compute_features` extrae las entradas una sola
+vez y evalúa todas las definiciones en una pasada; `get_features` guarda el
+resultado como columnas Feather por versión del CSV y de FEATURES_VERSION, de
+modo que el EDA (página 2) y train_model_melb.py reutilizan la misma
+materialización.
+
+Ejecutar desde la raíz del proyecto (opcional; se genera al primer uso):
+
+    python features_melb.py
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils_melb import cache_dir, cache_key, cached_artifact, load_raw
+
+DATA_PATH = Path("data") / "melb_data.csv"
+
+# Subir la versión al cambiar cualquier definición invalida las columnas guardadas.
+FEATURES_VERSION = 1
+REFERENCE_YEAR = 2025
+
+
+def _age(c: dict) -> np.ndarray:
+    return REFERENCE_YEAR - c["YearBuilt"]
+
+
+def _price_m2(c: dict) -> np.ndarray:
+    # área construida 0 o faltante no define un precio por m²
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(c["BuildingArea"] > 0, c["Price"] / c["BuildingArea"], np.nan)
+
+
+def _density(c: dict) -> np.ndarray:
+    # Propertycount relativo a la cantidad de registros de la región
+    codes = c["Regionname"]
+    ok = codes >= 0
+    counts = np.bincount(codes[ok], minlength=codes.max() + 1 if ok.any() else 0)
+    out = np.full(len(codes), np.nan)
+    out[ok] = c["Propertycount"][ok] / counts[codes[ok]]
+    return out
+
+
+FEATURES = {
+    "Age": {"inputs": ["YearBuilt"], "fn": _age,
+            "descripcion": f"Antigüedad de la vivienda ({REFERENCE_YEAR} - YearBuilt)."},
+    "Price_m2": {"inputs": ["Price", "BuildingArea"], "fn": _price_m2,
+                 "descripcion": "Precio por m² construido (solo BuildingArea > 0)."},
+    "Density": {"inputs": ["Propertycount", "Regionname"], "fn": _density,
+                "descripcion": "Propertycount dividido por los registros de su región."},
+}
+
+TARGET = "Price"
+# las variables que usan el precio no pueden ser predictores del precio
+MODEL_FEATURES = [name for name, f in FEATURES.items() if TARGET not in f["inputs"]]
+
+
+def _inputs(df: pd.DataFrame, cols) -> dict:
+    """{columna: arreglo}: float64 para numéricas y códigos enteros (-1 = faltante) para categóricas."""
+    out = {}
+    for col in cols:
+        s = df[col]
+        if pd.api.types.is_numeric_dtype(s):
+            out[col] = s.to_numpy(dtype="float64", na_value=np.nan)
+        else:
+            out[col] = pd.factorize(s)[0]
+    return out
+
+
+def compute_features(df: pd.DataFrame, names=None) -> pd.DataFrame:
+    """Variables `names` (por defecto todas) de `df`, con su mismo índice."""
+    names = list(FEATURES) if names is None else list(names)
+    needed = dict.fromkeys(c for n in names for c in FEATURES[n]["inputs"])
+    cols = _inputs(df, needed)
+    return pd.DataFrame({n: FEATURES[n]["fn"](cols) for n in names}, index=df.index)
+
+
+def add_features(df: pd.DataFrame, names=None) -> pd.DataFrame:
+    """`df` con las variables `names` recalculadas desde sus propias columnas (paso de Pipeline)."""
+    return df.assign(**compute_features(df, names))
+
+
+def features_path(path: str) -> Path:
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.features.v{FEATURES_VERSION}.arrow"
+
+
+def get_features(path: str = str(DATA_PATH)) -> pd.DataFrame:
+    """compute_features(load_raw(path)) guardado por versión (disco + memoria del proceso).
+
+    Las filas están alineadas con load_raw(path): se unen con `df.join(...)`.
+    """
+    return cached_artifact(features_path(path), lambda: compute_features(load_raw(path)), pd.read_feather,
+                           lambda feats, tmp: feats.reset_index(drop=True).to_feather(tmp),
+                           stale=f"{Path(path).stem}.*.features.*.arrow")
+
+
+def with_features(df: pd.DataFrame, path: str = str(DATA_PATH), names=None) -> pd.DataFrame:
+    """`df` (load_raw(path) o un subconjunto de sus filas) con las variables derivadas agregadas."""
+    feats = get_features(path)
+    return df.join(feats[list(FEATURES) if names is None else list(names)])
+
+
+if __name__ == "__main__":
+    feats = get_features()
+    print(f"Variables derivadas guardadas en: {features_path(str(DATA_PATH))}")
+    print(feats.describe().T)
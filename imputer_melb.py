@@ -0,0 +1,233 @@
+"""
+Imputador fit/transform para el dataset Melbourne Housing.
+
+`MelbImputer` aprende en `fit` las mismas reglas de `utils_melb.imputation_plan`
+(simple, por grupos o constante) y guarda las medianas/modas por grupo como tablas
+de consulta, una por nivel de la jerarquía espacial (`utils_melb.HIER_LEVELS`).
+`transform` solo hace búsquedas: no recalcula estadísticos sobre el marco recibido,
+por lo que sirve dentro de un Pipeline de sklearn (sin fuga de información del
+conjunto de prueba) y para imputar un registro nuevo en O(1).
+
+Con `incremental=True` el imputador guarda además estado fusionable por grupo
+(sketches de cuantiles para medianas y tablas de conteo para modas) para todas
+las columnas de ajuste, también las que llegaron completas: cada lote
+semanal nuevo se incorpora con `partial_fit` en tiempo proporcional al lote, y
+`recompute` hace periódicamente el recálculo exacto sobre el historial completo,
+reportando la deriva de las tablas incrementales.
+"""
+
+import numpy as np
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from utils_melb import HIER_LEVELS, QuantileSketch, hierarchical_stats, imputation_rules
+
+
+def _fill(s: pd.Series, fill) -> pd.Series:
+    """fillna que agrega a las categorías los valores de relleno que falten."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        values = pd.Series(fill).dropna().unique() if isinstance(fill, pd.Series) else [fill]
+        new = [v for v in values if v not in s.cat.categories]
+        if new:
+            s = s.cat.add_categories(new)
+    return s.fillna(fill)
+
+
+def _sketches_by_group(keys: np.ndarray, values: np.ndarray, size: int) -> dict:
+    """Un QuantileSketch por grupo, ordenando una sola vez (grupo, valor)."""
+    ok = ~pd.isna(keys) & ~np.isnan(values)
+    if not ok.any():
+        return {}
+    codes, uniques = pd.factorize(keys[ok])
+    v = values[ok]
+    order = np.lexsort((v, codes))
+    codes, v = codes[order], v[order]
+    bounds = np.flatnonzero(np.diff(codes)) + 1
+    groups = uniques[codes[np.r_[0, bounds]]]
+    return {g: QuantileSketch(size).update(chunk) for g, chunk in zip(groups, np.split(v, bounds))}
+
+
+def _counts_by_group(keys: np.ndarray, values: pd.Series) -> dict:
+    """{grupo: {valor: conteo}} con un único value_counts sobre (grupo, valor)."""
+    pairs = pd.DataFrame({"g": keys, "v": values.astype(object).to_numpy()}).dropna()
+    out = {}
+    for (g, v), n in pairs.value_counts(sort=False).items():
+        out.setdefault(g, {})[v] = int(n)
+    return out
+
+
+def _mode(counts: dict):
+    # mayor conteo; en empate el menor valor (como Series.mode)
+    return min(counts, key=lambda v: (-counts[v], v))
+
+
+class MelbImputer(BaseEstimator, TransformerMixin):
+    """Imputador con estadísticos persistidos por grupo y respaldo jerárquico.
+
+    Las reglas por grupo se resuelven por `levels` (por defecto Suburb → Postcode →
+    CouncilArea → Regionname) y, si ningún nivel tiene dato, con el valor global.
+
+    Tras `fit` quedan:
+    - `rules_`: {columna: (ámbito, estadístico)} según `imputation_rules`, para todas
+      las columnas de ajuste (las completas con la regla simple).
+    - `levels_`: niveles de la jerarquía presentes en los datos de ajuste.
+    - `lookup_`: {columna: [{grupo: valor} por nivel]} para las reglas por grupo.
+    - `global_`: {columna: valor} de respaldo (grupos sin datos o no vistos en fit).
+    """
+
+    def __init__(self, levels=tuple(HIER_LEVELS), incremental=False, sketch_size=256):
+        self.levels = levels
+        self.incremental = incremental
+        self.sketch_size = sketch_size
+
+    def fit(self, X, y=None):
+        X = pd.DataFrame(X)
+        # todas las columnas reciben regla: las completas en fit pueden traer faltantes después
+        self.rules_ = imputation_rules(X, all_columns=True)
+        self.levels_ = [lvl for lvl in self.levels if lvl in X.columns]
+        self.global_ = {}
+        for col, (scope, stat) in self.rules_.items():
+            s = X[col]
+            if stat == "media":
+                self.global_[col] = float(s.mean())
+            elif stat == "mediana":
+                self.global_[col] = float(s.median())
+            elif stat == "moda":
+                m = s.mode(dropna=True)
+                self.global_[col] = m.iloc[0] if not m.empty else "Desconocido"
+            else:
+                self.global_[col] = stat
+        by_group = [c for c, (scope, _) in self.rules_.items() if scope == "grupo"]
+        stats = hierarchical_stats(X, by_group, self.levels_)
+        self.lookup_ = {c: [stats[lvl][c].dropna().to_dict() for lvl in self.levels_]
+                        for c in by_group}
+        self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        self.n_features_in_ = X.shape[1]
+        if self.incremental:
+            self.state_ = {"sum": {}, "count": {}, "sketch": {}, "counts": {}}
+            self._update_state(X)
+        return self
+
+    def partial_fit(self, X, y=None):
+        """Incorpora un lote nuevo: actualiza el estado y solo los grupos presentes en el lote."""
+        X = pd.DataFrame(X)
+        if not hasattr(self, "rules_"):
+            self.incremental = True
+            return self.fit(X)
+        if not hasattr(self, "state_"):
+            raise ValueError("partial_fit requiere un MelbImputer ajustado con incremental=True.")
+        touched = self._update_state(X)
+        for col, per_level in touched.items():
+            scope, stat = self.rules_[col]
+            # solo las reglas por grupo tienen tablas por nivel; el resto solo actualiza global_
+            for i, lvl in enumerate(self.levels_ if scope == "grupo" else ()):
+                table = self.lookup_[col][i]
+                for g in per_level.get(lvl, ()):
+                    if stat == "mediana":
+                        table[g] = float(self.state_["sketch"][col][lvl][g].quantile(0.5))
+                    else:
+                        table[g] = _mode(self.state_["counts"][col][lvl][g])
+            if stat == "media":
+                self.global_[col] = self.state_["sum"][col] / self.state_["count"][col]
+            elif stat == "mediana":
+                self.global_[col] = float(self.state_["sketch"][col][None][None].quantile(0.5))
+            elif stat == "moda":
+                self.global_[col] = _mode(self.state_["counts"][col][None][None])
+        return self
+
+    def _update_state(self, X: pd.DataFrame) -> dict:
+        """Fusiona los estadísticos del lote en state_; devuelve {col: {nivel: grupos tocados}}."""
+        st = self.state_
+        touched = {}
+        for col, (scope, stat) in self.rules_.items():
+            if col not in X.columns or stat not in ("media", "mediana", "moda"):
+                continue
+            levels = [lvl for lvl in self.levels_ if lvl in X.columns] if scope == "grupo" else []
+            # nivel None = global (un único grupo None)
+            keyed = [(None, np.full(len(X), None, dtype=object))]
+            keyed += [(lvl, X[lvl].astype(object).to_numpy()) for lvl in levels]
+            touched[col] = {}
+            if stat in ("media", "mediana"):
+                vals = X[col].to_numpy(dtype="float64", na_value=np.nan)
+                st["sum"][col] = st["sum"].get(col, 0.0) + float(np.nansum(vals))
+                st["count"][col] = st["count"].get(col, 0) + int((~np.isnan(vals)).sum())
+                per_col = st["sketch"].setdefault(col, {})
+                for lvl, keys in keyed:
+                    size = self.sketch_size if lvl is not None else 32 * self.sketch_size
+                    if lvl is None:
+                        batch = {None: QuantileSketch(size).update(vals)}
+                    else:
+                        batch = _sketches_by_group(keys, vals, size)
+                    table = per_col.setdefault(lvl, {})
+                    for g, sk in batch.items():
+                        table[g] = table[g].merge(sk) if g in table else sk
+                    touched[col][lvl] = batch.keys()
+            else:
+                per_col = st["counts"].setdefault(col, {})
+                for lvl, keys in keyed:
+                    batch = _counts_by_group(keys if lvl is not None else np.zeros(len(X)), X[col])
+                    if lvl is None:
+                        batch = {None: batch.get(0, {})} if batch else {}
+                    table = per_col.setdefault(lvl, {})
+                    for g, counts in batch.items():
+                        merged = table.setdefault(g, {})
+                        for v, n in counts.items():
+                            merged[v] = merged.get(v, 0) + n
+                    touched[col][lvl] = batch.keys()
+        return touched
+
+    def drift_report(self, X) -> pd.DataFrame:
+        """Compara las tablas incrementales con el recálculo exacto sobre el historial X."""
+        X = pd.DataFrame(X)
+        by_group = [c for c, (scope, _) in self.rules_.items() if scope == "grupo"]
+        exact = hierarchical_stats(X, by_group, self.levels_)
+        rows = []
+        for col in by_group:
+            for i, lvl in enumerate(self.levels_):
+                ref = exact[lvl][col].dropna()
+                cur = pd.Series(self.lookup_[col][i], dtype=ref.dtype).reindex(ref.index)
+                if self.rules_[col][1] == "mediana":
+                    diff = (cur.astype("float64") - ref.astype("float64")).abs()
+                    rows.append((col, lvl, len(ref), float(diff.mean()), float(diff.max()), np.nan))
+                else:
+                    rows.append((col, lvl, len(ref), np.nan, np.nan, float((cur != ref).mean())))
+        return pd.DataFrame(rows, columns=["variable", "nivel", "grupos", "dif_media_abs",
+                                           "dif_max_abs", "pct_modas_distintas"])
+
+    def recompute(self, X) -> pd.DataFrame:
+        """Recálculo exacto periódico: reporta la deriva y reajusta sobre el historial X."""
+        report = self.drift_report(X)
+        self.fit(X)
+        return report
+
+    def transform(self, X):
+        X = pd.DataFrame(X).copy(deep=False)
+        for col, (scope, _) in self.rules_.items():
+            if col not in X.columns or not X[col].isna().any():
+                continue
+            s = X[col]
+            if scope == "grupo":
+                for lvl, table in zip(self.levels_, self.lookup_[col]):
+                    if lvl in X.columns:
+                        s = _fill(s, X[lvl].astype(object).map(table))
+            X[col] = _fill(s, self.global_[col])
+        return X
+
+    def impute_record(self, record: dict) -> dict:
+        """Imputa un único registro (dict) con búsquedas en diccionario, sin pasar por un DataFrame."""
+        out = dict(record)
+        for col, (scope, _) in self.rules_.items():
+            if not pd.isna(out.get(col, np.nan)):
+                continue
+            value = None
+            if scope == "grupo":
+                for lvl, table in zip(self.levels_, self.lookup_[col]):
+                    value = table.get(record.get(lvl))
+                    if value is not None:
+                        break
+            out[col] = self.global_[col] if value is None else value
+        return out
+
+    def get_feature_names_out(self, input_features=None):
+        return np.asarray(self.feature_names_in_ if input_features is None else input_features,
+                          dtype=object)
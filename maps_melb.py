@@ -0,0 +1,370 @@
+"""
+Capas de mapa (folium/Leaflet) del dataset Melbourne Housing.
+
+`PointCluster` envía las propiedades al navegador como un único arreglo columnar
+(lat, lon, precio, cuartil, habitaciones, baños y códigos de tipo/suburbio con
+sus tablas de valores) y los marcadores, colores y popups se crean en el cliente:
+en Python no se construye un objeto por fila y el tiempo de armado del mapa es
+el de serializar unas pocas listas.
+
+`HexPyramid` agrega las propiedades en hexágonos (coordenadas axiales sobre una
+proyección plana local) a varios tamaños, con conteo, mediana y mezcla de
+cuartiles por celda. El mapa elige el tamaño según el zoom de `st_folium` y solo
+envía las celdas visibles: la carga depende del área de pantalla, no de las filas.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import folium
+from branca.element import Element
+from folium.plugins import MarkerCluster
+from folium.template import Template
+
+from utils_melb import cache_dir, cache_key, cached_artifact, get_outlier_index, load_raw
+
+PRICE_QUARTILES = ["Q1 (Bajo)", "Q2", "Q3", "Q4 (Alto)"]
+QUARTILE_COLORS = {
+    "Q1 (Bajo)": "#9ecae1",
+    "Q2": "#6baed6",
+    "Q3": "#3182bd",
+    "Q4 (Alto)": "#08519c",
+}
+
+
+def _nullable(s: pd.Series, decimals=None) -> list:
+    """Lista JSON de una columna numérica con None en los faltantes."""
+    x = s.to_numpy(dtype="float64", na_value=np.nan)
+    if decimals is not None:
+        x = np.round(x, decimals)
+    out = x.astype(object)
+    out[np.isnan(x)] = None
+    return out.tolist()
+
+
+def _coded(s: pd.Series) -> tuple:
+    codes, uniques = pd.factorize(s.astype(object))
+    return codes.tolist(), [str(u) for u in uniques]
+
+
+def point_payload(df: pd.DataFrame) -> dict:
+    """Arreglo columnar de las filas con coordenadas y precio, con el cuartil de precio de cada una."""
+    d = df.dropna(subset=["Lattitude", "Longtitude", "Price"])
+    quartile = pd.qcut(d["Price"], 4, labels=False)
+    types, type_values = _coded(d["Type"])
+    suburbs, suburb_values = _coded(d["Suburb"])
+    return {
+        "lat": _nullable(d["Lattitude"], 5),
+        "lon": _nullable(d["Longtitude"], 5),
+        "price": _nullable(d["Price"], 0),
+        "q": quartile.astype("int64").tolist(),
+        "rooms": _nullable(d["Rooms"]),
+        "bath": _nullable(d["Bathroom"]),
+        "type": types,
+        "types": type_values,
+        "suburb": suburbs,
+        "suburbs": suburb_values,
+    }
+
+
+class _RawScript(Element):
+    """Script que se inserta tal cual: folium compila como plantilla Jinja lo que
+    emiten las macros, y hacerlo con el arreglo de datos cuesta segundos."""
+
+    def __init__(self, text: str):
+        super().__init__()
+        self.text = text
+
+    def render(self, **kwargs):
+        return self.text
+
+
+class PointCluster(MarkerCluster):
+    """Cluster de CircleMarkers (canvas) creados en el navegador desde point_payload.
+
+    El color sale del cuartil de precio y el popup se arma al hacer clic a partir
+    de las columnas del arreglo, igual al que mostraba cada CircleMarker.
+    """
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = (function(){
+                var d = {{ this.get_name() }}_data;
+                var colors = {{ this.colors|tojson }};
+                var renderer = L.canvas({padding: 0.5});
+                var cluster = L.markerClusterGroup({{ this.options|tojavascript }});
+                function val(v) { return v === null ? "N/A" : v; }
+                function popup(layer) {
+                    var i = layer.options.idx;
+                    return "<b>Precio:</b> $" + d.price[i].toLocaleString("en-US") + " AUD<br>"
+                        + "<b>Habitaciones:</b> " + val(d.rooms[i]) + "<br>"
+                        + "<b>Baños:</b> " + val(d.bath[i]) + "<br>"
+                        + "<b>Tipo:</b> " + d.types[d.type[i]] + "<br>"
+                        + "<b>Suburbio:</b> " + d.suburbs[d.suburb[i]];
+                }
+                var markers = new Array(d.lat.length);
+                for (var i = 0; i < d.lat.length; i++) {
+                    var c = colors[d.q[i]];
+                    markers[i] = L.circleMarker([d.lat[i], d.lon[i]], {
+                        renderer: renderer, radius: 4, color: c, fill: true,
+                        fillColor: c, fillOpacity: 0.6, idx: i
+                    }).bindPopup(popup);
+                }
+                cluster.addLayers(markers);
+                cluster.addTo({{ this._parent.get_name() }});
+                return cluster;
+            })();
+        {% endmacro %}"""
+    )
+
+    def __init__(self, df: pd.DataFrame, name=None, **kwargs):
+        kwargs.setdefault("chunkedLoading", True)
+        super().__init__(name=name, **kwargs)
+        self._name = "PointCluster"
+        self.payload = json.dumps(point_payload(df), ensure_ascii=False, separators=(",", ":"))
+        self.colors = [QUARTILE_COLORS[q] for q in PRICE_QUARTILES]
+
+    def render(self, **kwargs):
+        # el arreglo va en su propio script, antes del que crea los marcadores
+        self.get_root().script.add_child(_RawScript(f"var {self.get_name()}_data = {self.payload};"),
+                                         name=self.get_name() + "_data")
+        super().render(**kwargs)
+
+
+# ============================
+# Pirámide de hexágonos
+# ============================
+
+# Subir la versión cuando cambie la grilla o las métricas invalida las pirámides guardadas.
+HEX_VERSION = 1
+HEX_SIZES_KM = [16.0, 8.0, 4.0, 2.0, 1.0, 0.5, 0.25]  # radio del hexágono por nivel
+HEX_TARGET_PX = 28  # ancho aproximado de un hexágono en pantalla
+MAP_CENTER = (-37.81, 144.96)  # origen de la proyección local (centro de Melbourne)
+KM_PER_DEG_LAT = 110.574
+KM_PER_DEG_LON = 111.320 * np.cos(np.radians(MAP_CENTER[0]))
+SQRT3 = np.sqrt(3.0)
+
+
+def _project(lat, lon) -> tuple:
+    """Coordenadas planas (km) alrededor de MAP_CENTER."""
+    return ((np.asarray(lon) - MAP_CENTER[1]) * KM_PER_DEG_LON,
+            (np.asarray(lat) - MAP_CENTER[0]) * KM_PER_DEG_LAT)
+
+
+def _unproject(x, y) -> tuple:
+    return MAP_CENTER[0] + y / KM_PER_DEG_LAT, MAP_CENTER[1] + x / KM_PER_DEG_LON
+
+
+def hex_axial(lat, lon, size: float) -> tuple:
+    """Celda axial (q, r) de hexágonos con vértice arriba y radio `size` km (redondeo cúbico)."""
+    x, y = _project(lat, lon)
+    qf = (SQRT3 / 3 * x - y / 3) / size
+    rf = (2 / 3 * y) / size
+    sf = -qf - rf
+    q, r, s = np.round(qf), np.round(rf), np.round(sf)
+    dq, dr, ds = np.abs(q - qf), np.abs(r - rf), np.abs(s - sf)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    q = np.where(fix_q, -r - s, q)
+    r = np.where(fix_r, -q - s, r)
+    return q.astype(np.int64), r.astype(np.int64)
+
+
+def hex_center(q, r, size: float) -> tuple:
+    """(lat, lon) del centro de las celdas (q, r)."""
+    return _unproject(size * SQRT3 * (q + r / 2), size * 1.5 * r)
+
+
+def hex_polygons(q, r, size: float) -> np.ndarray:
+    """Vértices (celdas × 7 × [lon, lat]) de cada hexágono, cerrados para GeoJSON."""
+    x = size * SQRT3 * (np.asarray(q) + np.asarray(r) / 2)
+    y = size * 1.5 * np.asarray(r)
+    ang = np.radians(30 + 60 * np.arange(7))
+    lat, lon = _unproject(x[:, None] + size * np.cos(ang), y[:, None] + size * np.sin(ang))
+    return np.stack([lon, lat], axis=-1)
+
+
+def hex_size_for_zoom(zoom: float) -> float:
+    """Nivel de la pirámide cuyo hexágono mide ~HEX_TARGET_PX píxeles al zoom dado."""
+    km_per_px = 156.543034 * np.cos(np.radians(MAP_CENTER[0])) / 2 ** zoom
+    target = HEX_TARGET_PX * km_per_px / SQRT3
+    sizes = np.asarray(HEX_SIZES_KM)
+    return float(sizes[np.argmin(np.abs(np.log(sizes / target)))])
+
+
+class HexPyramid:
+    """Celdas hexagonales de `value` en todos los niveles de HEX_SIZES_KM.
+
+    `cells` tiene una fila por celda no vacía y nivel: size, q, r, lat, lon (centro),
+    n, mediana y q1..q4 (cantidad de filas de la celda en cada cuartil global de
+    `value`, con los bordes en `edges`).
+    """
+
+    def __init__(self, cells: pd.DataFrame, edges: np.ndarray, value: str):
+        self.cells = cells
+        self.edges = edges
+        self.value = value
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, value: str = "Price", sizes=HEX_SIZES_KM) -> "HexPyramid":
+        d = df.dropna(subset=["Lattitude", "Longtitude", value])
+        lat = d["Lattitude"].to_numpy(dtype="float64")
+        lon = d["Longtitude"].to_numpy(dtype="float64")
+        v = d[value].to_numpy(dtype="float64")
+        edges = np.quantile(v, [0.25, 0.5, 0.75]) if len(v) else np.zeros(3)
+        quartile = np.searchsorted(edges, v, side="left")
+        levels = []
+        for size in sizes:
+            q, r = hex_axial(lat, lon, size)
+            key, codes = np.unique(q * (1 << 32) + r, return_inverse=True)
+            cell = np.stack([(key + (1 << 31)) >> 32, (key + (1 << 31)) % (1 << 32) - (1 << 31)], axis=1)
+            codes = codes.ravel()
+            # mediana por celda: ordenar por (celda, valor) y tomar el centro de cada tramo
+            order = np.lexsort((v, codes))
+            n = np.bincount(codes, minlength=len(cell))
+            start = np.r_[0, np.cumsum(n)[:-1]]
+            sv = v[order]
+            median = (sv[start + (n - 1) // 2] + sv[start + n // 2]) / 2
+            mix = np.bincount(codes * 4 + quartile, minlength=len(cell) * 4).reshape(-1, 4)
+            c_lat, c_lon = hex_center(cell[:, 0], cell[:, 1], size)
+            levels.append(pd.DataFrame({
+                "size": size, "q": cell[:, 0], "r": cell[:, 1], "lat": c_lat, "lon": c_lon,
+                "n": n, "mediana": median,
+                **{f"q{i + 1}": mix[:, i] for i in range(4)},
+            }))
+        return cls(pd.concat(levels, ignore_index=True), edges, value)
+
+    def view(self, zoom: float, bounds=None) -> pd.DataFrame:
+        """Celdas del nivel de `zoom` cuyo centro cae en `bounds` (con un hexágono de margen).
+
+        `bounds` sigue el formato de st_folium: {"_southWest": {"lat", "lng"}, "_northEast": {...}}.
+        """
+        size = hex_size_for_zoom(zoom)
+        cells = self.cells[self.cells["size"] == size]
+        if bounds:
+            pad_lat = 2 * size / KM_PER_DEG_LAT
+            pad_lon = 2 * size / KM_PER_DEG_LON
+            sw, ne = bounds["_southWest"], bounds["_northEast"]
+            cells = cells[cells["lat"].between(sw["lat"] - pad_lat, ne["lat"] + pad_lat)
+                          & cells["lon"].between(sw["lng"] - pad_lon, ne["lng"] + pad_lon)]
+        return cells
+
+    def geojson(self, cells: pd.DataFrame) -> dict:
+        """FeatureCollection de `cells` con color por cuartil global de la mediana y la mezcla en %."""
+        if cells.empty:
+            return {"type": "FeatureCollection", "features": []}
+        size = float(cells["size"].iloc[0])
+        rings = np.round(hex_polygons(cells["q"].to_numpy(), cells["r"].to_numpy(), size), 5).tolist()
+        colors = np.asarray([QUARTILE_COLORS[q] for q in PRICE_QUARTILES])
+        color = colors[np.searchsorted(self.edges, cells["mediana"].to_numpy(), side="left")].tolist()
+        n = cells["n"].to_numpy()
+        mix = cells[["q1", "q2", "q3", "q4"]].to_numpy() / n[:, None] * 100
+        mix_text = [" / ".join(f"{p:.0f}%" for p in row) for row in mix]
+        median = [f"{m:,.0f}" for m in cells["mediana"].to_numpy()]
+        features = [
+            {"type": "Feature", "geometry": {"type": "Polygon", "coordinates": [ring]},
+             "properties": {"n": int(k), "mediana": m, "mezcla": t, "color": c}}
+            for ring, k, m, t, c in zip(rings, n, median, mix_text, color)
+        ]
+        return {"type": "FeatureCollection", "features": features}
+
+    def save(self, target: Path) -> None:
+        np.savez(target, edges=self.edges, meta=np.array(json.dumps({"value": self.value})),
+                 **{f"c_{c}": self.cells[c].to_numpy() for c in self.cells.columns})
+
+    @classmethod
+    def load(cls, target: Path) -> "HexPyramid":
+        with np.load(target) as z:
+            cells = pd.DataFrame({k[2:]: z[k] for k in z.files if k.startswith("c_")})
+            return cls(cells, z["edges"], json.loads(str(z["meta"]))["value"])
+
+
+def bounds_contain(outer, inner, margin_km: float = 0.0) -> bool:
+    """True si los límites `inner` de st_folium caen dentro de `outer` ampliado en `margin_km`
+    (outer None = todo el mapa)."""
+    if not outer:
+        return True
+    if not inner:
+        return False
+    dlat, dlon = margin_km / KM_PER_DEG_LAT, margin_km / KM_PER_DEG_LON
+    sw, ne = outer["_southWest"], outer["_northEast"]
+    return (sw["lat"] - dlat <= inner["_southWest"]["lat"] and sw["lng"] - dlon <= inner["_southWest"]["lng"]
+            and ne["lat"] + dlat >= inner["_northEast"]["lat"] and ne["lng"] + dlon >= inner["_northEast"]["lng"])
+
+
+DEFAULT_VIEW = {"zoom": 11, "center": list(MAP_CENTER), "bounds": None}
+
+
+def next_view(view: dict, returned) -> dict:
+    """Vista nueva a partir de lo que devolvió st_folium, o None si la capa enviada sigue sirviendo.
+
+    Se recalcula cuando el zoom cambia de nivel de la pirámide o cuando la vista sale
+    de las celdas enviadas (que la cubren con dos hexágonos de margen).
+    """
+    if not returned or returned.get("zoom") is None:
+        return None
+    size = hex_size_for_zoom(view["zoom"])
+    bounds = returned.get("bounds")
+    if hex_size_for_zoom(returned["zoom"]) == size and bounds_contain(view["bounds"], bounds, margin_km=size):
+        return None
+    center = returned.get("center") or {}
+    return {"zoom": returned["zoom"],
+            "center": [center.get("lat", view["center"][0]), center.get("lng", view["center"][1])],
+            "bounds": bounds}
+
+
+def hex_layer(pyramid: HexPyramid, zoom: float, bounds=None, name: str = "Hexágonos", label=None):
+    """Capa GeoJson de folium con las celdas visibles; el estilo y el tooltip salen de las propiedades."""
+    if label is None:
+        label = "Precio mediano (AUD)" if pyramid.value == "Price" else f"Mediana de {pyramid.value}"
+    return folium.GeoJson(
+        pyramid.geojson(pyramid.view(zoom, bounds)),
+        name=name,
+        style_function=lambda f: {"fillColor": f["properties"]["color"], "color": "#ffffff",
+                                  "weight": 0.5, "fillOpacity": 0.7},
+        tooltip=folium.GeoJsonTooltip(fields=["n", "mediana", "mezcla"],
+                                      aliases=["Propiedades", label, "Q1 / Q2 / Q3 / Q4"]),
+    )
+
+
+def hex_pyramid_path(path: str, drop_outliers: bool = False) -> Path:
+    stem = Path(path).stem
+    variant = "sin-outliers" if drop_outliers else "todas"
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.hex.v{HEX_VERSION}.{variant}.npz"
+
+
+def get_hex_pyramid(path: str, drop_outliers: bool = False) -> HexPyramid:
+    """HexPyramid de Price para load_raw(path) (sin outliers IQR de Price si se pide), por versión del CSV."""
+    target = hex_pyramid_path(path, drop_outliers)
+
+    def build():
+        df = load_raw(path)
+        if drop_outliers:
+            df = df[~get_outlier_index(path, rule="iqr").mask(["Price"])]
+        return HexPyramid.build(df)
+
+    # se limpian otras versiones del CSV o de la grilla; se conservan ambas variantes
+    return cached_artifact(target, build, HexPyramid.load, HexPyramid.save,
+                           stale=f"{Path(path).stem}.*.hex.*.npz",
+                           keep=target.name.split(".hex.")[0] + f".hex.v{HEX_VERSION}.")
+
+
+def error_pyramid_path(pred_path: str) -> Path:
+    stem = Path(pred_path).stem
+    return cache_dir(pred_path) / f"{stem}.{cache_key(pred_path)}.hex.v{HEX_VERSION}.error-abs.npz"
+
+
+def get_error_pyramid(pred_path: str) -> HexPyramid:
+    """HexPyramid del error absoluto de las predicciones (CSV con Error y coordenadas).
+
+    Se guarda por hash del CSV de predicciones: solo se reconstruye al reentrenar.
+    """
+    def build():
+        df = pd.read_csv(pred_path)
+        return HexPyramid.build(df.assign(error_abs=df["Error"].abs()), value="error_abs")
+
+    return cached_artifact(error_pyramid_path(pred_path), build, HexPyramid.load, HexPyramid.save,
+                           stale=f"{Path(pred_path).stem}.*.hex.*.npz")
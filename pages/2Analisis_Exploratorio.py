@@ -1,19 +1,28 @@
 import streamlit as st
 import plotly.express as px
+import numpy as np
 import pandas as pd
-from utils_melb import load_raw, missing_table, PALETTE, ACCENT
+from cube_melb import ALL, ROLLING_WINDOWS, TIME_FREQS, get_time_cube, time_slice
+from eda_melb import load_eda_artifacts, frame
+from utils_melb import PALETTE, ACCENT
+from viz_melb import BIN_SCALES, density_figure, histogram_figure, points_figure
 
 st.title("2. Análisis exploratorio de datos")
 
-df = load_raw("data/melb_data.csv")
+# Todo lo calculado sale del paquete EDA precalculado por versión del CSV (eda_melb.py)
+eda = load_eda_artifacts("data/melb_data.csv")
 
 st.subheader("2.1 Tamaño y tipos")
 c1, c2 = st.columns(2)
 with c1:
-    st.write(f"Filas: {df.shape[0]}")
+    st.write(f"Filas: {eda['rows']}")
 with c2:
-    st.write(f"Columnas: {df.shape[1]}")
-st.dataframe(df.dtypes.rename("dtype"))
+    st.write(f"Columnas: {eda['cols']}")
+st.dataframe(pd.Series(eda["dtypes"], name="dtype"))
+
+with st.expander("Memoria del esquema compacto (antes vs después)"):
+    st.caption("Categóricas para columnas de baja/media cardinalidad, enteros angostos y float32 sin pérdida; `Date` se parsea al cargar.")
+    st.dataframe(frame(eda, "schema_memory"))
 
 st.markdown("""
 ### Análisis e interpretación de las variables del conjunto Melbourne Housing
@@ -61,22 +70,29 @@ y observaciones relevantes para la etapa de imputación o modelado posterior.
 
 st.subheader("2.1 Revisión de duplicados")
 
-duplicados = df.duplicated().sum()
+duplicados = eda["duplicates"]
 
 st.write(f"**Total de registros duplicados:** {duplicados}")
 
 if duplicados > 0:
     st.warning(f"Se encontraron {duplicados} registros duplicados. Se eliminarán para garantizar trazabilidad.")
-    df = df.drop_duplicates()
 else:
     st.success("No se encontraron registros duplicados en el dataset.")
 
+near = eda["near_duplicates"]
+st.write(f"**Posibles duplicados** (misma dirección, suburbio y fecha normalizados, con algún otro campo distinto): "
+         f"{near['filas']} registros en {near['grupos']} grupos")
+if near["filas"]:
+    st.dataframe(frame(near, "muestra"))
+    st.caption("Se conservan: pueden ser el mismo aviso cargado por dos agencias o con datos corregidos; "
+               "conviene revisarlos antes de descartarlos.")
+
 
 
 
 st.subheader("2.2 Valores faltantes")
 st.markdown("Se cuantifica el porcentaje de nulos para identificar variables críticas.")
-st.dataframe(missing_table(df))
+st.dataframe(frame(eda, "missing"))
 # =========================================
 # Comentario interpretativo sobre valores faltantes
 # =========================================
@@ -138,16 +154,8 @@ En etapas posteriores se evaluará el impacto de la imputación mediante un **an
 
 st.subheader("2.3 Feature Engineering y trazabilidad")
 
-# Crear variable de antigüedad
-df["Age"] = 2025 - df["YearBuilt"]
-
-# Crear variable de precio por m² (si existen datos válidos)
-df["Price_m2"] = df["Price"] / df["BuildingArea"]
-
-# Crear variable de densidad urbana aproximada
-df["Density"] = df["Propertycount"] / df.groupby("Regionname")["Propertycount"].transform("count")
-
-st.write(df[["Price", "BuildingArea", "Price_m2", "Age", "Density"]].head())
+# Antigüedad (Age), precio por m² (Price_m2) y densidad urbana aproximada (Density)
+st.write(frame(eda, "features_head"))
 
 st.markdown("""
 Se generan nuevas variables derivadas que enriquecen el análisis:
@@ -160,7 +168,7 @@ Estas transformaciones aportan trazabilidad al proceso y mejoran la capacidad ex
 
 
 st.subheader("2.4 Estadísticos descriptivos (numéricos)")
-st.dataframe(df.select_dtypes("number").describe().T)
+st.dataframe(frame(eda, "describe"))
 # =========================================
 # Comentario interpretativo del análisis descriptivo numérico
 # =========================================
@@ -243,24 +251,16 @@ Variable útil como indicador de tamaño de mercado local.
 
 st.subheader("2.5 Detección de outliers")
 
-numeric_cols = df.select_dtypes(include=["number"]).columns
-
-outlier_summary = []
-
-for col in numeric_cols:
-    Q1 = df[col].quantile(0.25)
-    Q3 = df[col].quantile(0.75)
-    IQR = Q3 - Q1
-    lower = Q1 - 1.5 * IQR
-    upper = Q3 + 1.5 * IQR
-    outliers = df[(df[col] < lower) | (df[col] > upper)][col].count()
-    outlier_summary.append((col, outliers))
-
-outlier_df = pd.DataFrame(outlier_summary, columns=["Variable", "Cantidad de outliers"])
+rule = st.selectbox("Regla", list(eda["outliers"]), index=0,
+                    format_func={"iqr": "IQR (k = 1.5)", "mad": "MAD (z modificado > 3.5)",
+                                 "zscore": "z-score (|z| > 3)"}.get)
+outlier_df = pd.DataFrame(**eda["outliers"][rule])
 st.dataframe(outlier_df)
 
 st.markdown("""
 Se emplea el método del rango intercuartílico (IQR) para identificar valores atípicos.
+Como contraste se ofrecen la regla MAD (mediana y desviación absoluta mediana, robusta a colas pesadas)
+y el z-score clásico. Los conteos provienen de un índice de outliers por fila reutilizable en el resto del tablero.
 """)
 
 # =========================================
@@ -298,11 +298,10 @@ Para el modelado posterior, se recomienda aplicar **winsorización, transformaci
 st.subheader("2.6 Distribuciones univariadas")
 
 
-num_candidates = [c for c in ["Price","Rooms","Distance","Landsize","BuildingArea",
-                              "Bedroom2","Bathroom","Car"] if c in df.columns]
-for col in num_candidates:
-    fig = px.histogram(df, x=col, nbins=30, color_discrete_sequence=[PALETTE[2]])
-    fig.update_layout(title=f"Distribución de {col}", bargap=0.02)
+scale = st.radio("Bins del histograma", BIN_SCALES, horizontal=True,
+                 help="fija: ancho constante; log: ancho constante en log10 (solo valores > 0); cuantiles: igual número de casos por bin")
+for col, per_scale in eda["histograms"].items():
+    fig = histogram_figure(per_scale[scale], title=f"Distribución de {col}", x_title=col, colors=[PALETTE[2]])
     st.plotly_chart(fig, use_container_width=True)
 st.caption("Las variables de precio y superficies muestran asimetría a la derecha; se recomienda usar mediana para imputación y medidas de tendencia central.")
 # =========================================
@@ -386,14 +385,21 @@ En conjunto, las variables numéricas reflejan un **mercado residencial heterog
 """)
 
 st.subheader("2.7 Relaciones bivariadas con Price")
-pairs = [c for c in ["Rooms","Distance","Landsize","BuildingArea"] if c in df.columns]
-for col in pairs:
-    if "Price" in df.columns:
-        fig = px.scatter(df, x=col, y="Price",
-                         opacity=0.4,
-                         color_discrete_sequence=[PALETTE[3]])
-        fig.update_layout(title=f"{col} vs Price")
-        st.plotly_chart(fig, use_container_width=True)
+# Puntos (WebGL) si el dataset es pequeño; si no, densidad 2D con color logarítmico
+points = frame(eda, "scatter") if "scatter" in eda else None
+as_density = st.checkbox("Vista de densidad (bins 2D, color en escala log)", value=points is None,
+                         disabled=points is None)
+drop_out = st.checkbox("Excluir outliers (IQR en la variable o en Price)", value=False)
+density = eda["density_sin_outliers"] if drop_out else eda["density"]
+for col, b in density.items():
+    if as_density:
+        fig = density_figure(b, title=f"{col} vs Price", x_title=col, y_title="Price",
+                             colorscale=[PALETTE[0], PALETTE[2], PALETTE[4]])
+    else:
+        pts = points.drop(index=eda["scatter_outliers"][col]) if drop_out else points
+        fig = points_figure(pts[col], pts["Price"], title=f"{col} vs Price",
+                            x_title=col, y_title="Price", color=PALETTE[3])
+    st.plotly_chart(fig, use_container_width=True)
 st.caption("Se observa relación positiva de Price con Rooms y BuildingArea; relación negativa con Distance.")
 # =========================================
 # Comentario interpretativo de relaciones bivariadas con Price
@@ -450,11 +456,18 @@ Las relaciones bivariadas confirman que:
 
 
 st.subheader("2.8 Correlaciones numéricas")
-num_cols = df.select_dtypes("number").columns
-corr = df[num_cols].corr()
+method = st.radio("Coeficiente", ["pearson", "spearman"], horizontal=True,
+                  format_func=str.capitalize,
+                  help="Observaciones completas por par: cada celda usa las filas sin faltantes en ambas variables.")
+corr = pd.DataFrame(**eda["corr"][method])
+n_pair = pd.DataFrame(**eda["corr"]["n"])
+p_pair = pd.DataFrame(**eda["corr"][f"p_{method}"])
 fig = px.imshow(corr, color_continuous_scale=[PALETTE[0], PALETTE[2], PALETTE[4]],
                 zmin=-1, zmax=1, aspect="auto")
-fig.update_layout(title="Matriz de correlaciones")
+fig.update_traces(customdata=np.dstack([n_pair.to_numpy(), p_pair.to_numpy()]),
+                  hovertemplate="%{y} – %{x}<br>r = %{z:.3f}<br>n = %{customdata[0]:,}"
+                                "<br>p-value = %{customdata[1]:.2g}<extra></extra>")
+fig.update_layout(title=f"Matriz de correlaciones ({method.capitalize()})")
 st.plotly_chart(fig, use_container_width=True)
 
 # =========================================
@@ -503,21 +516,10 @@ En conjunto, la matriz de correlaciones ofrece evidencia sólida sobre las depen
 # =========================================
 # 2.9 Análisis temporal del precio de vivienda
 # =========================================
-import plotly.express as px
-import streamlit as st
-import pandas as pd
-
 st.subheader("2.9 Análisis temporal del precio promedio")
 
-# Aseguramos que la columna de fecha esté en formato datetime
-df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
-
-# Creamos una columna "Year" (si no existe)
-if "Year" not in df.columns:
-    df["Year"] = df["Date"].dt.year
-
-# Calculamos el precio promedio por año
-price_trend = df.groupby("Year", as_index=False)["Price"].mean().dropna()
+# Precio promedio por año (Year, o el año de Date si la columna no existe)
+price_trend = frame(eda, "year_trend")
 
 # Gráfico temporal
 fig_time = px.line(
@@ -539,6 +541,28 @@ fig_time.update_layout(
 
 st.plotly_chart(fig_time, use_container_width=True)
 
+# Con solo dos años la tendencia anual es gruesa: el cubo temporal precalculado
+# (mensual/semanal × región × tipo) permite ver la serie fina como un filtro
+cube = get_time_cube("data/melb_data.csv")
+c1, c2, c3 = st.columns(3)
+with c1:
+    freq = st.selectbox("Granularidad", list(TIME_FREQS), index=0)
+with c2:
+    region = st.selectbox("Región", [ALL] + sorted(set(cube["Regionname"].astype(str)) - {ALL}))
+with c3:
+    tipo = st.selectbox("Tipo", [ALL] + sorted(set(cube["Type"].astype(str)) - {ALL}))
+serie = time_slice(cube, freq, Regionname=region, Type=tipo)
+fig_cube = px.line(
+    serie.melt(id_vars=["periodo", "n"], value_vars=["media", "mediana", "media_movil"],
+               var_name="Medida", value_name="Precio"),
+    x="periodo", y="Precio", color="Medida", hover_data=["n"],
+    labels={"periodo": "Período", "Precio": "Precio (AUD)"},
+    color_discrete_sequence=[PALETTE[2], PALETTE[4], ACCENT],
+    title=f"Precio {freq} — región: {region}, tipo: {tipo} (ventana móvil de {ROLLING_WINDOWS[freq]} períodos)",
+)
+fig_cube.update_layout(template="simple_white", yaxis=dict(tickformat=".0f"))
+st.plotly_chart(fig_cube, use_container_width=True)
+
 # =========================================
 # Comentarios sobre el análisis temporal del precio promedio
 # =========================================
@@ -570,28 +594,33 @@ posiblemente asociada a un ajuste natural del ciclo inmobiliario en la ciudad.
 
 st.subheader("2.10 Evidencias analíticas y validación estadística")
 
-from scipy import stats
+tests = eda["tests"]
+st.caption(f"Intervalos de confianza del 95% por bootstrap percentil ({tests['replicas']} réplicas por prueba), "
+           "precalculados por versión del dataset.")
 
-# Prueba de normalidad (Shapiro-Wilk)
-sample_price = df["Price"].dropna().sample(500, random_state=42)
-shapiro_test = stats.shapiro(sample_price)
+# Prueba de normalidad (Shapiro-Wilk): una muestra de 500 precios y su distribución bootstrap
+shapiro_test = tests["shapiro"]
 
 st.write("**Prueba de normalidad (Shapiro-Wilk) para Price:**")
-st.write(f"Estadístico = {shapiro_test.statistic:.4f}, p-value = {shapiro_test.pvalue:.4f}")
+st.write(f"Estadístico = {shapiro_test['statistic']:.4f}, p-value = {shapiro_test['pvalue']:.4f} "
+         f"(n = {shapiro_test['n']}); IC 95% de W en submuestras de {shapiro_test['n']}: "
+         f"[{shapiro_test['ic95'][0]:.4f}, {shapiro_test['ic95'][1]:.4f}], "
+         f"rechazo de normalidad en el {shapiro_test['tasa_rechazo']:.0%} de las submuestras")
 
-if shapiro_test.pvalue < 0.05:
+if shapiro_test["pvalue"] < 0.05:
     st.warning("Los datos de Price **no siguen una distribución normal** (p < 0.05). Se sugiere usar métodos no paramétricos.")
 else:
     st.success("Los datos de Price son aproximadamente normales (p > 0.05).")
 
 # Prueba de homogeneidad de varianzas (Levene)
-groups = [df[df["Rooms"] == i]["Price"].dropna() for i in [2, 3, 4]]
-stat, p = stats.levene(*groups)
-st.write(f"**Prueba de Levene (Rooms 2–4):** Estadístico = {stat:.4f}, p-value = {p:.4f}")
+lev = tests["levene"]
+st.write(f"**Prueba de Levene (Rooms 2–4):** Estadístico = {lev['statistic']:.4f}, p-value = {lev['pvalue']:.4f} "
+         f"(n = {lev['n']:,}); IC 95%: [{lev['ic95'][0]:.1f}, {lev['ic95'][1]:.1f}]")
 
 # Correlación Spearman (Price vs Distance)
-rho, pval = stats.spearmanr(df["Price"], df["Distance"], nan_policy="omit")
-st.write(f"**Correlación Spearman Price–Distance:** rho = {rho:.3f}, p-value = {pval:.4f}")
+sp = tests["spearman"]
+st.write(f"**Correlación Spearman Price–Distance:** rho = {sp['rho']:.3f}, p-value = {sp['pvalue']:.4f} "
+         f"(n = {sp['n']:,}); IC 95%: [{sp['ic95'][0]:.3f}, {sp['ic95'][1]:.3f}]")
 
 # =========================================
 # Comentarios sobre las evidencias analíticas y validación estadística
@@ -1,12 +1,18 @@
 import streamlit as st
-from utils_melb import load_raw, imputation_plan, impute_df, missing_table, PALETTE
+from utils_melb import get_dataset, get_imputed, SPATIAL_COLS, imputation_plan, get_imputation_lineage, lineage_summary, missing_table, PALETTE
 
 st.title("3. Imputación de los datos")
 
-df = load_raw("data/melb_data.csv")
+df = get_dataset("data/melb_data.csv")
 
 st.subheader("3.1 Porcentaje de valores faltantes y plan de imputación")
-plan = imputation_plan(df)
+knn_cols = st.multiselect(
+    "Regla espacial KNN (opcional): imputar con la mediana de los vecinos más cercanos por Lattitude/Longtitude",
+    SPATIAL_COLS, default=st.session_state.get("imp_knn_cols", []),
+)
+# solo se guarda el plan elegido; el marco imputado vive en la caché en disco
+st.session_state["imp_knn_cols"] = knn_cols
+plan = imputation_plan(df, knn_cols=knn_cols)
 st.dataframe(plan)
 # =========================================
 # Comentarios sobre las decisiones de imputación
@@ -44,8 +50,8 @@ Este esquema garantiza **consistencia, trazabilidad y justificación metodológi
 
 st.subheader("3.2 Aplicación de imputación")
 st.markdown("Se aplican las reglas: 0–5% simple; 5–30% por grupos (Suburb/Regionname); >30% conservar si es clave e imputar por grupos.")
-df_imp = impute_df(df)
-st.success("Imputación finalizada.")
+df_imp = get_imputed("data/melb_data.csv", knn_cols=knn_cols)
+st.success("Imputación finalizada (se reutiliza la caché en disco si el CSV y el plan no cambiaron).")
 
 st.subheader("3.3 Validación inmediata")
 st.markdown("Verificación de reducción de nulos post–imputación.")
@@ -64,9 +70,9 @@ Los resultados confirman una **mejora sustancial en la completitud del dataset**
 - La mayoría de las variables presentan ahora un **0% de valores faltantes**, lo cual evidencia que las estrategias de imputación aplicadas fueron **efectivas y consistentes**.  
   Variables como *Rooms*, *Suburb*, *Price*, *Type*, *Method* y *SellerG* quedaron completamente completas.
 
-- En las variables **YearBuilt (0.13%)** y **BuildingArea (0.12%)**, persisten mínimos porcentajes de ausencia.  
-  Esto puede deberse a registros sin información contextual suficiente (*Suburb* o *Regionname*) para aplicar la imputación condicional, o a casos con datos atípicos difíciles de estimar.  
-  Sin embargo, estos porcentajes son **marginales** y no afectan significativamente el análisis general.
+- En las variables **YearBuilt** y **BuildingArea** la imputación por grupos deja un residuo mínimo (≈0.1%):  
+  registros de suburbios sin ningún valor observado para aplicar la imputación condicional.  
+  Ese residuo se completa con el **respaldo jerárquico** descrito en la sección 3.4, por lo que el dataset imputado queda sin faltantes.
 
 - La **reducción global de nulos** demuestra la **eficiencia del pipeline de limpieza y ETL**, ya que se pasó de porcentajes altos (cercanos al 40% en algunas variables) a valores casi nulos tras la imputación.  
   Además, se mantuvo la **coherencia semántica** de los datos, evitando sustituciones aleatorias o inconsistentes.
@@ -75,6 +81,17 @@ En conclusión, la **validación inmediata post–imputación** confirma que el
 para los procedimientos estadísticos y de modelado que se desarrollan en las siguientes fases del proyecto.
 """)
 
-
-# Guardado opcional para usar en páginas siguientes
-st.session_state["df_imp"] = df_imp
+st.subheader("3.4 Respaldo jerárquico para los faltantes residuales")
+st.markdown("""
+Los faltantes que quedan en *YearBuilt* y *BuildingArea* corresponden a suburbios sin ningún valor observado.
+Se resuelven con una jerarquía espacial **Suburb → Postcode → CouncilArea → Regionname → global**:
+las medianas/modas de cada nivel se calculan una sola vez y cada celda toma el primer nivel con dato.
+La tabla indica qué nivel completó cada celda (linaje de la imputación).
+""")
+# el linaje se calcula una sola vez con la imputación y se guarda junto a ella
+lineage = get_imputation_lineage("data/melb_data.csv", knn_cols=knn_cols)
+if len(lineage.columns):
+    st.dataframe(lineage_summary(lineage))
+    st.caption(f"Faltantes restantes en el dataset imputado: {int(df_imp[list(lineage.columns)].isna().sum().sum())}")
+else:
+    st.success("No quedan faltantes residuales tras la imputación por grupos.")
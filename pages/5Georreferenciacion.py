@@ -2,54 +2,51 @@
 # 5. Georreferenciación interactiva
 # =========================================
 import streamlit as st
-import pandas as pd
 import folium
-from folium.plugins import MarkerCluster
 from streamlit_folium import st_folium
-from utils_melb import load_raw
+from maps_melb import (
+    DEFAULT_VIEW, PointCluster, get_hex_pyramid, hex_layer, hex_size_for_zoom, next_view,
+)
+from utils_melb import get_dataset, get_outlier_index
 
 st.header("5. Georreferenciación")
 st.subheader("5.1 Mapa interactivo de precios de vivienda en Melbourne")
-df = load_raw("data/melb_data.csv")
-# Filtrar datos válidos
-geo_df = df.dropna(subset=["Lattitude", "Longtitude", "Price"]).copy()
-
-# Crear cuartiles de precios
-geo_df["price_bin"] = pd.qcut(geo_df["Price"], 4, labels=["Q1 (Bajo)", "Q2", "Q3", "Q4 (Alto)"])
-
-# Crear mapa centrado en Melbourne
-m = folium.Map(location=[-37.81, 144.96], zoom_start=11, tiles="CartoDB positron")
-
-# Agregar puntos con colores por cuartil
-color_dict = {
-    "Q1 (Bajo)": "#9ecae1",
-    "Q2": "#6baed6",
-    "Q3": "#3182bd",
-    "Q4 (Alto)": "#08519c"
-}
-
-marker_cluster = MarkerCluster().add_to(m)
-
-for _, row in geo_df.iterrows():
-    popup_text = f"""
-    <b>Precio:</b> ${row['Price']:,.0f} AUD<br>
-    <b>Habitaciones:</b> {row.get('Rooms', 'N/A')}<br>
-    <b>Baños:</b> {row.get('Bathroom', 'N/A')}<br>
-    <b>Tipo:</b> {row.get('Type', 'N/A')}<br>
-    <b>Suburbio:</b> {row.get('Suburb', 'N/A')}
-    """
-    folium.CircleMarker(
-        location=[row["Lattitude"], row["Longtitude"]],
-        radius=4,
-        color=color_dict[row["price_bin"]],
-        fill=True,
-        fill_color=color_dict[row["price_bin"]],
-        fill_opacity=0.6,
-        popup=popup_text
-    ).add_to(marker_cluster)
+vista = st.radio("Vista", ["Hexágonos (agregado)", "Propiedades"], horizontal=True)
+drop_outliers = st.checkbox("Excluir outliers de Price (IQR)", value=False)
+
+# Vista actual del mapa (zoom, centro y límites devueltos por st_folium en el rerun anterior)
+view = st.session_state.get("mapa5_vista", DEFAULT_VIEW)
+
+# Crear mapa centrado en la vista actual
+m = folium.Map(location=view["center"], zoom_start=view["zoom"], tiles="CartoDB positron")
+
+if vista.startswith("Hexágonos"):
+    # Pirámide precalculada por versión del CSV: el tamaño del hexágono sale del zoom
+    # y solo se envían las celdas visibles, no las propiedades
+    pyramid = get_hex_pyramid("data/melb_data.csv", drop_outliers=drop_outliers)
+    hex_layer(pyramid, view["zoom"], view["bounds"]).add_to(m)
+    st.caption(f"Hexágonos de {hex_size_for_zoom(view['zoom']):g} km de radio; color según el cuartil "
+               "global del precio mediano de la celda.")
+else:
+    df = get_dataset("data/melb_data.csv")
+    if drop_outliers:
+        # máscara precalculada por versión del CSV: no se vuelve a recorrer el dataset
+        df = df[~get_outlier_index("data/melb_data.csv", rule="iqr").mask(["Price"])]
+    # Puntos coloreados por cuartil de precio: se envían como un arreglo columnar y
+    # los marcadores y popups se crean en el navegador (maps_melb.PointCluster)
+    PointCluster(df).add_to(m)
 
 # Mostrar mapa interactivo
-st_data = st_folium(m, width=800, height=500)
+st_data = st_folium(m, width=800, height=500, key="mapa5",
+                    returned_objects=["zoom", "center", "bounds"])
+
+# Si el zoom cambia de nivel o el usuario se desplaza fuera de las celdas enviadas,
+# se recalcula la capa para la nueva vista
+new_view = next_view(view, st_data)
+if new_view is not None:
+    st.session_state["mapa5_vista"] = new_view
+    if vista.startswith("Hexágonos"):
+        st.rerun()
 
 # Comentario interpretativo
 st.markdown("""
@@ -4,12 +4,15 @@
 import json
 from pathlib import Path
 
+import folium
 import pandas as pd
-import plotly.express as px
 import streamlit as st
 from joblib import load
+from streamlit_folium import st_folium
 
+from maps_melb import DEFAULT_VIEW, get_error_pyramid, hex_layer, next_view
 from utils_melb import PALETTE, ACCENT
+from viz_melb import bin_counts, histogram_figure, scatter_figure
 
 # Rutas de artefactos del modelo pre-entrenado
 MODELS_DIR = Path("models")
@@ -109,17 +112,15 @@ logra explicar una gran proporción de la variabilidad en el precio de las vivie
 st.subheader("7.2 Relación entre precio real y precio predicho")
 
 if {"Price_real", "Price_pred"}.issubset(df_pred.columns):
-    fig_scatter = px.scatter(
-        df_pred,
-        x="Price_real",
-        y="Price_pred",
-        labels={
-            "Price_real": "Precio real (AUD)",
-            "Price_pred": "Precio predicho (AUD)",
-        },
-        opacity=0.6,
-        color_discrete_sequence=[PALETTE[-1]],
+    # WebGL para conjuntos de prueba pequeños; densidad 2D (color log) para los grandes
+    fig_scatter = scatter_figure(
+        df_pred["Price_real"],
+        df_pred["Price_pred"],
         title="Dispersión de precios reales vs. predichos",
+        x_title="Precio real (AUD)",
+        y_title="Precio predicho (AUD)",
+        color=PALETTE[-1],
+        colorscale=[PALETTE[0], PALETTE[2], PALETTE[4]],
     )
 
     # Línea de referencia y = x (predicción perfecta)
@@ -165,13 +166,11 @@ else:
 st.subheader("7.3 Distribución del error de predicción")
 
 if "Error" in df_pred.columns:
-    fig_hist = px.histogram(
-        df_pred,
-        x="Error",
-        nbins=40,
-        labels={"Error": "Error (Price_real − Price_pred) [AUD]"},
-        color_discrete_sequence=[PALETTE[3]],
+    fig_hist = histogram_figure(
+        bin_counts(df_pred["Error"], bins=40),
         title="Histograma del error de predicción",
+        x_title="Error (Price_real − Price_pred) [AUD]",
+        colors=[PALETTE[3]],
     )
     fig_hist.update_layout(bargap=0.05)
     st.plotly_chart(fig_hist, use_container_width=True)
@@ -200,13 +199,10 @@ else:
 st.subheader("7.4 Error de predicción en el espacio geográfico")
 
 if {"Lattitude", "Longtitude"}.issubset(df_pred.columns):
-    df_map = df_pred.copy()
-    df_map = df_map.rename(columns={"Lattitude": "lat", "Longtitude": "lon"})
-
     st.markdown(
         """
-A continuación se muestra un mapa simple con la ubicación de las viviendas del conjunto
-de prueba, coloreadas según el **error de predicción**.  
+A continuación se muestra un mapa de las viviendas del conjunto de prueba agregadas en
+hexágonos, coloreados según el **error absoluto de predicción** mediano de cada celda.  
 
 Esto permite explorar si existen **zonas de la ciudad donde el modelo tiende a fallar más**,
 lo cual puede estar asociado a patrones urbanos específicos o a la falta de variables
@@ -214,16 +210,20 @@ explicativas adicionales.
 """
     )
 
-    # Para evitar mapas muy pesados, se puede muestrear si hay demasiados puntos
-    if len(df_map) > 5000:
-        df_map_sample = df_map.sample(5000, random_state=42)
-    else:
-        df_map_sample = df_map
-
-    # Normalizar error para mostrarlo en una columna aparte (no afecta st.map)
-    df_map_sample["error_abs"] = df_map_sample["Error"].abs()
-
-    st.map(df_map_sample[["lat", "lon", "error_abs"]])
+    # Error absoluto agregado en hexágonos (maps_melb.HexPyramid, guardado por hash del CSV
+    # de predicciones): el tamaño sale del zoom del mapa y solo se envían las celdas visibles
+    pyramid = get_error_pyramid(str(PRED_PATH))
+    view = st.session_state.get("mapa7_vista", DEFAULT_VIEW)
+    m = folium.Map(location=view["center"], zoom_start=view["zoom"], tiles="CartoDB positron")
+    hex_layer(pyramid, view["zoom"], view["bounds"], name="Error absoluto",
+              label="Error absoluto mediano (AUD)").add_to(m)
+    st.caption("Color según el cuartil del error absoluto mediano de cada hexágono (Q1 = error bajo).")
+    st_data = st_folium(m, width=800, height=500, key="mapa7",
+                        returned_objects=["zoom", "center", "bounds"])
+    new_view = next_view(view, st_data)
+    if new_view is not None:
+        st.session_state["mapa7_vista"] = new_view
+        st.rerun()
 
 else:
     st.info(
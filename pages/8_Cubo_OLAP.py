@@ -0,0 +1,79 @@
+# =========================================
+# 8. Cubo OLAP: cortes por suburbio, tipo, año y habitaciones
+# =========================================
+import time
+
+import plotly.express as px
+import streamlit as st
+
+from cube_melb import OLAP_DIMS, get_olap_cube
+from utils_melb import PALETTE, ACCENT
+
+st.title("8. Cubo OLAP")
+st.markdown("""
+Cada consulta se responde desde un **cubo preagregado** (cuboides sobre Suburb × Regionname ×
+CouncilArea × Type × Method × Rooms × mes con conteos, sumas e histogramas de precio): no se
+recorren las filas del dataset, y se usa el cuboide más chico que contiene las dimensiones
+agrupadas y filtradas. Las medianas se estiman del histograma logarítmico acumulado de las celdas elegidas.
+""")
+
+cube = get_olap_cube("data/melb_data.csv")
+
+METRICS = {
+    "n": "Cantidad de ventas",
+    "precio_medio": "Precio medio (AUD)",
+    "precio_mediano": "Precio mediano (AUD)",
+    "precio_m2_medio": "Precio medio por m² (AUD)",
+    "precio_m2_mediano": "Precio mediano por m² (AUD)",
+}
+
+# =========================================
+# 8.1 Filtros y agrupación
+# =========================================
+st.subheader("8.1 Corte del cubo")
+filters = {}
+cols = st.columns(4)
+for i, dim in enumerate(["Regionname", "CouncilArea", "Suburb", "Type", "Method", "Rooms", "Año"]):
+    with cols[i % 4]:
+        filters[dim] = st.multiselect(dim, cube.values(dim), default=[])
+
+c1, c2 = st.columns(2)
+with c1:
+    by = st.multiselect("Agrupar por (hasta 2)", OLAP_DIMS,
+                        default=["Regionname", "Type"], max_selections=2)
+with c2:
+    metric = st.selectbox("Métrica", list(METRICS), index=2, format_func=METRICS.get)
+
+t0 = time.perf_counter()
+result = cube.query(by=by, **filters)
+ms = (time.perf_counter() - t0) * 1000
+dims, cells, *_ = cube.cuboids[cube.cuboid_for(by + [d for d, v in filters.items() if v])]
+st.caption(f"Consulta resuelta en {ms:.1f} ms sobre {len(cells):,} celdas del cuboide {' × '.join(dims)}.")
+
+result = result[result["n"] > 0]
+if result.empty:
+    st.info("No hay ventas para la combinación de filtros elegida.")
+    st.stop()
+
+# =========================================
+# 8.2 Resultado
+# =========================================
+st.subheader("8.2 Resultado")
+if len(by) == 1:
+    fig = px.bar(result.astype({by[0]: str}), x=by[0], y=metric, hover_data=["n"],
+                 labels={metric: METRICS[metric]}, color_discrete_sequence=[PALETTE[3]])
+    fig.update_layout(template="simple_white", yaxis=dict(tickformat=",.0f"))
+    st.plotly_chart(fig, use_container_width=True)
+elif len(by) == 2:
+    pivot = result.pivot(index=by[0], columns=by[1], values=metric)
+    fig = px.imshow(pivot, aspect="auto", color_continuous_scale=[PALETTE[0], ACCENT],
+                    labels={"color": METRICS[metric]})
+    fig.update_layout(template="simple_white")
+    st.plotly_chart(fig, use_container_width=True)
+else:
+    st.metric(METRICS[metric], f"{result[metric].iloc[0]:,.0f}")
+
+st.dataframe(result.style.format({
+    "precio_medio": "{:,.0f}", "precio_mediano": "{:,.0f}",
+    "precio_m2_medio": "{:,.0f}", "precio_m2_mediano": "{:,.0f}",
+}), use_container_width=True)
@@ -0,0 +1,295 @@
+"""
+Servicio de correlaciones (Melbourne Housing).
+
+`correlations` calcula en una sola pasada vectorizada las matrices de Pearson y
+Spearman con observaciones completas por par (pairwise), junto con el tamaño de
+muestra y el p-valor de cada par. `get_correlations` las guarda por versión del
+CSV y conjunto de columnas, para que el mapa de calor y la sección de evidencia
+estadística compartan un único cálculo.
+
+`bootstrap_tests` remuestrea las pruebas de la sección 2.10 (Shapiro-Wilk,
+Levene y Spearman) en lotes vectorizados, opcionalmente repartidos en un pool de
+procesos, y reporta intervalos de confianza percentil.
+"""
+
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from utils_melb import cache_dir, cache_key, cached_artifact, load_raw
+
+# Subir la versión cuando cambie el cálculo invalida las matrices en caché.
+CORR_VERSION = 1
+CORR_KEYS = ["pearson", "spearman", "n", "p_pearson", "p_spearman"]
+
+
+def _pairwise_pearson(X: np.ndarray):
+    """Pearson pairwise-complete de todas las columnas de X con productos matriciales.
+
+    Devuelve (r, n). Las sumas se hacen sobre datos centrados en la media de cada
+    columna para evitar cancelación numérica.
+    """
+    valid = ~np.isnan(X)
+    M = valid.astype("float64")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        Xc = np.where(valid, X - np.nanmean(X, axis=0), 0.0)
+        n = M.T @ M
+        sx = Xc.T @ M                   # sx[i, j] = suma de x_i donde i y j son válidos
+        sxx = (Xc * Xc).T @ M
+        sxy = Xc.T @ Xc
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n
+        r = cov / np.sqrt(var_i * var_i.T)
+    r = np.where(n > 1, np.clip(r, -1.0, 1.0), np.nan)
+    np.fill_diagonal(r, np.where(np.diag(n) > 1, 1.0, np.nan))
+    return r, n
+
+
+def _ranks(order: np.ndarray, values: np.ndarray, rows=None) -> np.ndarray:
+    """Rangos promedio (empates) de una columna sobre `rows` (por defecto sus filas válidas).
+
+    `order` es el argsort de la columna y `values` sus valores en ese orden (NaN al
+    final). Filtrar un orden ya calculado lo conserva, así que rankear cualquier
+    subconjunto de filas es O(n), sin reordenar.
+    """
+    keep = ~np.isnan(values)
+    if rows is not None:
+        keep &= rows[order]
+    idx, v = order[keep], values[keep]
+    starts = np.flatnonzero(np.r_[True, v[1:] != v[:-1]]) if len(v) else np.array([], dtype=np.int64)
+    ends = np.r_[starts[1:], len(v)]
+    out = np.full(len(order), np.nan)
+    out[idx] = np.repeat((starts + ends + 1) / 2.0, ends - starts)
+    return out
+
+
+def _pvalues(r: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """p-valor bilateral de H0: ρ = 0 con t = r √((n-2)/(1-r²)) y n-2 grados de libertad."""
+    dof = n - 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+        p = 2 * stats.t.sf(np.abs(t), dof)
+    p = np.where(np.abs(r) == 1.0, 0.0, p)
+    return np.where(dof > 0, p, np.nan)
+
+
+def correlations(df: pd.DataFrame, cols=None) -> dict:
+    """Pearson y Spearman pairwise-complete, n por par y p-valores, como DataFrames.
+
+    Spearman es Pearson sobre rangos promedio. Las columnas se ordenan una sola vez;
+    los pares cuyas columnas tienen faltantes distintos se vuelven a rankear sobre
+    sus filas comunes (lo que exige la definición exacta) filtrando ese mismo orden.
+    """
+    cols = list(df.select_dtypes(include=[np.number]).columns) if cols is None else list(cols)
+    X = df[cols].to_numpy(dtype="float64", na_value=np.nan)
+    pearson, n = _pairwise_pearson(X)
+    # una fila contigua por variable: orden y valores ordenados (NaN al final)
+    order = np.argsort(X.T, axis=1, kind="stable")
+    values = np.take_along_axis(X.T, order, axis=1)
+    R = np.column_stack([_ranks(order[j], values[j]) for j in range(len(cols))]) if cols else X
+    spearman, _ = _pairwise_pearson(R)
+    valid = ~np.isnan(X)
+    counts = valid.sum(axis=0)
+    for i, j in zip(*np.triu_indices(len(cols), k=1)):
+        if n[i, j] == counts[i] == counts[j] or n[i, j] < 2:
+            continue  # mismo patrón de faltantes: los rangos por columna ya son exactos
+        rows = valid[:, i] & valid[:, j]
+        # una columna que conserva todas sus filas válidas mantiene sus rangos globales
+        ri = (R[:, i] if n[i, j] == counts[i] else _ranks(order[i], values[i], rows))[rows]
+        rj = (R[:, j] if n[i, j] == counts[j] else _ranks(order[j], values[j], rows))[rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            spearman[i, j] = spearman[j, i] = np.corrcoef(ri, rj)[0, 1]
+    frame = lambda a: pd.DataFrame(a, index=cols, columns=cols)
+    return {
+        "pearson": frame(pearson),
+        "spearman": frame(spearman),
+        "n": frame(n.astype(np.int64)),
+        "p_pearson": frame(_pvalues(pearson, n)),
+        "p_spearman": frame(_pvalues(spearman, n)),
+    }
+
+
+def corr_pair(corr: dict, a: str, b: str, method: str = "spearman") -> dict:
+    """Coeficiente, p-valor y n de un par concreto a partir del resultado de correlations."""
+    return {"r": float(corr[method].at[a, b]), "pvalue": float(corr[f"p_{method}"].at[a, b]),
+            "n": int(corr["n"].at[a, b])}
+
+
+def corr_path(path: str, cols) -> Path:
+    """Ruta en caché para la versión actual del CSV y el conjunto de columnas."""
+    colkey = hashlib.sha256(json.dumps(list(cols)).encode()).hexdigest()[:12]
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.corr.v{CORR_VERSION}.{colkey}.npz"
+
+
+def get_correlations(path: str, cols=None) -> dict:
+    """correlations(load_raw(path), cols) con caché en disco y en memoria del proceso."""
+    if cols is None:
+        cols = list(load_raw(path).select_dtypes(include=[np.number]).columns)
+    cols = list(cols)
+    target = corr_path(path, cols)
+
+    def load(t):
+        with np.load(t) as z:
+            return {k: pd.DataFrame(z[k], index=cols, columns=cols) for k in CORR_KEYS}
+
+    # se limpian otras versiones del CSV o del cálculo; se conservan otros conjuntos de columnas
+    return cached_artifact(target, lambda: correlations(load_raw(path), cols), load,
+                           lambda corr, tmp: np.savez(tmp, **{k: v.to_numpy() for k, v in corr.items()}),
+                           stale=f"{Path(path).stem}.*.corr.*.npz",
+                           keep=target.name.split(".corr.")[0] + f".corr.v{CORR_VERSION}.")
+
+
+# ============================
+# Bootstrap de las pruebas estadísticas
+# ============================
+
+BOOT_REPLICAS = 1000
+BOOT_BATCH = 50          # réplicas por tarea del pool (cada lote se calcula vectorizado)
+SHAPIRO_N = 500          # tamaño de cada submuestra de Shapiro-Wilk
+LEVENE_ROOMS = [2, 3, 4]
+
+
+def _spearman_batch(x: np.ndarray, y: np.ndarray, idx: np.ndarray) -> np.ndarray:
+    """rho de Spearman para cada fila de índices remuestreados idx (réplicas × n)."""
+    rx = stats.rankdata(x[idx], axis=1)
+    ry = stats.rankdata(y[idx], axis=1)
+    rx -= rx.mean(axis=1, keepdims=True)
+    ry -= ry.mean(axis=1, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (rx * ry).sum(axis=1) / np.sqrt((rx * rx).sum(axis=1) * (ry * ry).sum(axis=1))
+
+
+def _levene_batch(groups, idxs) -> np.ndarray:
+    """Estadístico de Levene centrado en la mediana (como scipy.stats.levene) por réplica."""
+    zs = [np.abs(g[i] - np.median(g[i], axis=1, keepdims=True)) for g, i in zip(groups, idxs)]
+    n = np.array([z.shape[1] for z in zs], dtype="float64")
+    N, k = n.sum(), len(zs)
+    zbar_i = np.stack([z.mean(axis=1) for z in zs], axis=1)              # réplicas × k
+    zbar = np.stack([z.sum(axis=1) for z in zs], axis=1).sum(axis=1) / N
+    num = (N - k) * (n * (zbar_i - zbar[:, None]) ** 2).sum(axis=1)
+    den = (k - 1) * sum(((z - zbar_i[:, [j]]) ** 2).sum(axis=1) for j, z in enumerate(zs))
+    return num / den
+
+
+def _shapiro_coefficients(n: int) -> np.ndarray:
+    """Coeficientes a_i de Shapiro-Wilk para n > 11 (aproximación de Royston, AS R94, como scipy)."""
+    m = stats.norm.ppf((np.arange(1, n + 1) - 0.375) / (n + 0.25))
+    mm = (m * m).sum()
+    u = 1 / np.sqrt(n)
+    c = m / np.sqrt(mm)
+    an = c[-1] + np.polyval([-2.706056, 4.434685, -2.071190, -0.147981, 0.221157, 0], u)
+    an1 = c[-2] + np.polyval([-3.582633, 5.682633, -1.752461, -0.293762, 0.042981, 0], u)
+    phi = (mm - 2 * m[-1] ** 2 - 2 * m[-2] ** 2) / (1 - 2 * an ** 2 - 2 * an1 ** 2)
+    a = m / np.sqrt(phi)
+    a[-1], a[-2], a[0], a[1] = an, an1, -an, -an1
+    return a
+
+
+def _shapiro_batch(X: np.ndarray) -> np.ndarray:
+    """W de Shapiro-Wilk y su p-valor (Royston) por fila de X (réplicas × n, n > 11)."""
+    n = X.shape[1]
+    Xs = np.sort(X, axis=1)
+    Xs -= Xs.mean(axis=1, keepdims=True)
+    w = (Xs @ _shapiro_coefficients(n)) ** 2 / (Xs * Xs).sum(axis=1)
+    w = np.minimum(w, 1.0)
+    ln_n = np.log(n)
+    mu = np.polyval([0.0038915, -0.083751, -0.31082, -1.5861], ln_n)
+    sigma = np.exp(np.polyval([0.0030302, -0.082676, -0.4803], ln_n))
+    with np.errstate(divide="ignore"):
+        p = stats.norm.sf((np.log1p(-w) - mu) / sigma)
+    return np.column_stack([w, p])
+
+
+_BOOT_DATA = {}  # arreglos de cada prueba en los procesos del pool (se envían una vez)
+
+
+def _init_bootstrap_worker(data: dict) -> None:
+    _BOOT_DATA.update(data)
+
+
+def _bootstrap_worker(task):
+    """Worker del pool: lote (prueba, semilla, réplicas) sobre los datos de _init_bootstrap_worker."""
+    test, seed, b = task
+    return _bootstrap_batch(test, seed, b, _BOOT_DATA[test])
+
+
+def _bootstrap_batch(test: str, seed, b: int, data):
+    """Un lote de réplicas de una prueba con su propia semilla."""
+    rng = np.random.default_rng(seed)
+    if test == "shapiro":
+        (x,) = data
+        # submuestras sin reemplazo: los SHAPIRO_N menores de claves aleatorias por réplica
+        idx = rng.random((b, len(x))).argpartition(SHAPIRO_N, axis=1)[:, :SHAPIRO_N]
+        return _shapiro_batch(x[idx])
+    if test == "levene":
+        idxs = [rng.integers(0, len(g), size=(b, len(g))) for g in data]
+        return _levene_batch(data, idxs)[:, None]
+    x, y = data
+    return _spearman_batch(x, y, rng.integers(0, len(x), size=(b, len(x))))[:, None]
+
+
+def _ci(values: np.ndarray, level: float = 0.95) -> list:
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return [np.nan, np.nan]
+    a = (1 - level) / 2 * 100
+    return [float(v) for v in np.percentile(values, [a, 100 - a])]
+
+
+def bootstrap_tests(df: pd.DataFrame, n_boot: int = BOOT_REPLICAS, n_jobs: int = 1, seed: int = 42) -> dict:
+    """Pruebas de la sección 2.10 sobre todos los datos con intervalos bootstrap del 95%.
+
+    - shapiro: `n_boot` submuestras de SHAPIRO_N precios (Shapiro-Wilk pierde
+      precisión con n grande); reporta la W de la primera submuestra tradicional
+      (sample(500, random_state=seed)), el IC de W y la tasa de rechazo (p < 0.05).
+    - levene: estadístico sobre todos los precios de Rooms 2–4 e IC por remuestreo
+      dentro de cada grupo.
+    - spearman: rho Price–Distance con todos los pares completos e IC por
+      remuestreo de pares.
+    Las réplicas se calculan en lotes de BOOT_BATCH; con `n_jobs` > 1 se reparten
+    en un pool "spawn" (seguro dentro del servidor de Streamlit, que tiene hilos)
+    que recibe los arreglos una sola vez al iniciar cada proceso. Las semillas de
+    cada lote salen de un SeedSequence, así que el resultado no depende del número
+    de procesos.
+    """
+    price = df["Price"].to_numpy(dtype="float64", na_value=np.nan)
+    price_ok = price[~np.isnan(price)]
+    rooms = df["Rooms"].to_numpy()
+    groups = [price[(rooms == r) & ~np.isnan(price)] for r in LEVENE_ROOMS]
+    dist = df["Distance"].to_numpy(dtype="float64", na_value=np.nan)
+    pair = ~np.isnan(price) & ~np.isnan(dist)
+    data = {"shapiro": (price_ok,), "levene": groups, "spearman": (price[pair], dist[pair])}
+
+    sizes = [BOOT_BATCH] * (n_boot // BOOT_BATCH) + ([n_boot % BOOT_BATCH] if n_boot % BOOT_BATCH else [])
+    tasks = []
+    for test, child in zip(data, np.random.SeedSequence(seed).spawn(len(data))):
+        tasks += [(test, s, b) for s, b in zip(child.spawn(len(sizes)), sizes)]
+    if n_jobs > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_bootstrap_worker, initargs=(data,)) as pool:
+            results = list(pool.map(_bootstrap_worker, tasks))
+    else:
+        results = [_bootstrap_batch(*t, data[t[0]]) for t in tasks]
+    reps = {test: np.concatenate([r for t, r in zip(tasks, results) if t[0] == test]) for test in data}
+
+    single = stats.shapiro(df["Price"].dropna().sample(SHAPIRO_N, random_state=seed))
+    lev = stats.levene(*groups)
+    rho = _spearman_batch(price[pair], dist[pair], np.arange(pair.sum())[None, :])[0]
+    sp_p = _pvalues(np.array(rho), np.array(pair.sum()))
+    return {
+        "replicas": int(n_boot),
+        "shapiro": {"statistic": float(single.statistic), "pvalue": float(single.pvalue),
+                    "n": SHAPIRO_N, "ic95": _ci(reps["shapiro"][:, 0]),
+                    "tasa_rechazo": float((reps["shapiro"][:, 1] < 0.05).mean())},
+        "levene": {"statistic": float(lev.statistic), "pvalue": float(lev.pvalue),
+                   "n": int(sum(len(g) for g in groups)), "ic95": _ci(reps["levene"][:, 0])},
+        "spearman": {"rho": float(rho), "pvalue": float(sp_p), "n": int(pair.sum()),
+                     "ic95": _ci(reps["spearman"][:, 0])},
+    }
@@ -2,11 +2,17 @@
 Script de entrenamiento de modelos de regresión para predecir Price
 usando el dataset Melbourne Housing.
 
-- Carga datos crudos desde data/melb_data.csv
-- Aplica la misma imputación definida en utils_melb.impute_df
+- Carga datos crudos desde data/melb_data.csv y les une Density (features_melb),
+  materializada una vez por versión del CSV
+- Separa train/test ANTES de imputar: la imputación (imputer_melb.MelbImputer,
+  mismas reglas que utils_melb.impute_df) es el primer paso del pipeline y
+  aprende sus medianas/modas por grupo solo con el conjunto de entrenamiento
+- Age se deriva de YearBuilt DESPUÉS del imputador, de modo que hereda la regla
+  de grupo de YearBuilt en lugar de caer a la mediana global
 - Entrena dos modelos: Ridge y RandomForest
 - Compara MAE y R² en un conjunto de prueba
-- Guarda el MEJOR modelo como models/melb_model.pkl
+- Guarda el MEJOR modelo como models/melb_model.pkl y su imputador ajustado
+  como models/melb_imputer.pkl
 - Guarda métricas en models/melb_metrics.json
 - Guarda predicciones de prueba en models/melb_test_predictions.csv
 
@@ -26,11 +32,13 @@ from sklearn.compose import ColumnTransformer
 from sklearn.metrics import mean_absolute_error, r2_score
 from sklearn.model_selection import train_test_split
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import FunctionTransformer, OneHotEncoder, StandardScaler
 from sklearn.linear_model import Ridge
 from sklearn.ensemble import RandomForestRegressor
 
-from utils_melb import load_raw, impute_df
+from features_melb import MODEL_FEATURES, add_features, with_features
+from imputer_melb import MelbImputer
+from utils_melb import load_raw
 
 # ============================
 # 1. Rutas y carga de datos
@@ -41,10 +49,12 @@ MODELS_DIR = Path("models")
 MODELS_DIR.mkdir(exist_ok=True)
 
 print(f"Cargando datos desde: {DATA_PATH}")
-df_raw = load_raw(str(DATA_PATH))
-
-print("Aplicando imputación definida en utils_melb.impute_df...")
-df = impute_df(df_raw)
+df = load_raw(str(DATA_PATH))
+# variables derivadas compartidas con el EDA (features_melb); Price_m2 queda fuera
+# de MODEL_FEATURES porque se calcula con el precio. Las que dependen de columnas
+# que imputa MelbImputer se calculan dentro del pipeline, tras imputar.
+POST_IMPUTE_FEATURES = ["Age"]
+df = with_features(df, str(DATA_PATH), [f for f in MODEL_FEATURES if f not in POST_IMPUTE_FEATURES])
 
 # ============================
 # 2. Definir variables
@@ -62,7 +72,8 @@ NUMERIC_FEATURES = [
     "Bathroom",
     "Car",
     "Propertycount",
-    "YearBuilt",
+    "Density",
+    "Age",  # reemplaza a YearBuilt (misma información, referida a REFERENCE_YEAR)
     "Lattitude",
     "Longtitude",
 ]
@@ -78,17 +89,17 @@ CATEGORICAL_FEATURES = [
 ]
 
 # Filtrar solo columnas disponibles (por si alguna no existe)
-NUMERIC_FEATURES = [c for c in NUMERIC_FEATURES if c in df.columns]
+NUMERIC_FEATURES = [c for c in NUMERIC_FEATURES if c in df.columns or c in POST_IMPUTE_FEATURES]
 CATEGORICAL_FEATURES = [c for c in CATEGORICAL_FEATURES if c in df.columns]
 
-FEATURES = NUMERIC_FEATURES + CATEGORICAL_FEATURES
+# entradas del pipeline: YearBuilt entra al imputador y sale convertida en Age
+FEATURES = [c for c in NUMERIC_FEATURES if c not in POST_IMPUTE_FEATURES] + ["YearBuilt"] + CATEGORICAL_FEATURES
 
 print("Variables numéricas usadas:", NUMERIC_FEATURES)
 print("Variables categóricas usadas:", CATEGORICAL_FEATURES)
 
-# Eliminar filas sin Price o sin alguna feature importante
+# Eliminar filas sin Price; los faltantes de las features los resuelve MelbImputer
 df_model = df.dropna(subset=[TARGET])
-df_model = df_model.dropna(subset=FEATURES)
 
 X = df_model[FEATURES]
 y = df_model[TARGET]
@@ -158,6 +169,8 @@ for name, reg in models.items():
     print(f"\nEntrenando modelo: {name} ...")
     pipe = Pipeline(
         steps=[
+            ("imputer", MelbImputer()),
+            ("features", FunctionTransformer(add_features, kw_args={"names": POST_IMPUTE_FEATURES})),
             ("preprocessor", preprocessor),
             ("regressor", reg),
         ]
@@ -191,12 +204,16 @@ print("======================================")
 # ============================
 
 MODEL_PATH = MODELS_DIR / "melb_model.pkl"
+IMPUTER_PATH = MODELS_DIR / "melb_imputer.pkl"
 METRICS_PATH = MODELS_DIR / "melb_metrics.json"
 PRED_PATH = MODELS_DIR / "melb_test_predictions.csv"
 
 print(f"Guardando mejor modelo en: {MODEL_PATH}")
 dump(best_pipeline, MODEL_PATH, compress=3)
 
+print(f"Guardando imputador ajustado en: {IMPUTER_PATH}")
+dump(best_pipeline.named_steps["imputer"], IMPUTER_PATH, compress=3)
+
 print(f"Guardando métricas en: {METRICS_PATH}")
 with open(METRICS_PATH, "w", encoding="utf-8") as f:
     json.dump(
@@ -210,7 +227,7 @@ with open(METRICS_PATH, "w", encoding="utf-8") as f:
     )
 
 print(f"Guardando predicciones de test en: {PRED_PATH}")
-df_pred = X_test.copy()
+df_pred = best_pipeline[:2].transform(X_test)  # imputer + features
 df_pred["Price_real"] = y_test
 df_pred["Price_pred"] = best_y_pred
 df_pred["Error"] = df_pred["Price_real"] - df_pred["Price_pred"]
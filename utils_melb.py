@@ -1,5 +1,21 @@
+import fnmatch
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import warnings
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
+from scipy.spatial import cKDTree
+
+# Copy-on-write: los marcos derivados nunca escriben sobre los buffers compartidos.
+pd.set_option("mode.copy_on_write", True)
 
 # Paleta única (azules) para todo el informe
 PALETTE = ["#cfe8ff", "#9dc9ff", "#6aa9ff", "#3a88f7", "#0f63d6"]
@@ -16,9 +32,155 @@ KEY_COLS = set([
     "YearBuilt","CouncilArea","Regionname","Suburb","Postcode","Type"
 ])
 
-def load_raw(path: str) -> pd.DataFrame:
-    """Carga el CSV con tipado básico y limpieza mínima de nombres."""
-    df = pd.read_csv(path, low_memory=False)
+# Esquema compacto y versionado del dataset. Subir SCHEMA_VERSION al modificarlo
+# (invalida los snapshots en caché). Los casteos numéricos solo se aplican si son
+# sin pérdida; si no, la columna conserva float64.
+SCHEMA_VERSION = 1
+SCHEMA = {
+    "Suburb": "category", "Type": "category", "Method": "category", "SellerG": "category",
+    "CouncilArea": "category", "Regionname": "category",
+    "Rooms": "int8", "Postcode": "int16", "Propertycount": "int32",
+    "Price": "float32", "Bedroom2": "float32", "Bathroom": "float32", "Car": "float32",
+    "Landsize": "float32", "YearBuilt": "float32",
+}
+DATE_FORMAT = "%d/%m/%Y"  # fechas día-primero, p. ej. 3/12/2016
+
+# Caché en disco junto al CSV (data/.cache). Subir la versión invalida snapshots previos.
+CACHE_DIR_NAME = ".cache"
+SNAPSHOT_VERSION = 1
+
+def cache_dir(path: str) -> Path:
+    """Directorio de caché asociado al archivo de datos.
+
+    No se crea aquí: lo crea quien escribe (save_artifact, el snapshot o el
+    manifiesto), dentro de su manejo de OSError, para que una carpeta de solo
+    lectura o un `.cache` que es archivo solo desactive la caché.
+    """
+    return Path(path).parent / CACHE_DIR_NAME
+
+# Hash por (ruta, tamaño, mtime) en memoria: respaldo cuando no se puede escribir el manifiesto.
+_VERSIONS: dict = {}
+
+def dataset_version(path: str) -> str:
+    """Hash sha256 del contenido del CSV; solo se recalcula si cambian tamaño o mtime."""
+    src = Path(path)
+    st = src.stat()
+    key = (str(src.resolve()), st.st_size, st.st_mtime_ns)
+    if key in _VERSIONS:
+        return _VERSIONS[key]
+    manifest = cache_dir(path) / f"{src.name}.manifest.json"
+    try:
+        meta = json.loads(manifest.read_text(encoding="utf-8"))
+        if meta["size"] == st.st_size and meta["mtime_ns"] == st.st_mtime_ns:
+            _VERSIONS[key] = meta["sha256"]
+            return meta["sha256"]
+    except (OSError, ValueError, KeyError):
+        pass
+    h = hashlib.sha256()
+    with open(src, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    _VERSIONS[key] = digest
+    try:
+        manifest.parent.mkdir(exist_ok=True)
+        manifest.write_text(json.dumps({"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                                        "sha256": digest}), encoding="utf-8")
+    except OSError:
+        pass  # sin manifiesto: el hash queda solo en memoria
+    return digest
+
+def cache_key(path: str) -> str:
+    """Clave común de los artefactos derivados: versión del CSV + SCHEMA_VERSION.
+
+    Cambiar el contenido del CSV o el esquema (dtypes) invalida todas las cachés.
+    """
+    return f"{dataset_version(path)[:16]}-s{SCHEMA_VERSION}"
+
+# Errores que invalidan un artefacto en disco (falta, está corrupto o no hay pyarrow).
+ARTIFACT_ERRORS = (ImportError, OSError, ValueError, KeyError, zipfile.BadZipFile)
+
+def save_artifact(obj, target: Path, save, stale: str = None, keep: str = None) -> bool:
+    """Escribe `obj` con save(obj, tmp) y lo renombra a `target` (atómico).
+
+    Si la caché no se puede escribir devuelve False y no lanza: el artefacto sigue
+    siendo válido en memoria. Con `stale` (patrón glob en la carpeta de `target`)
+    borra los archivos que no empiecen por `keep` (por defecto, el propio target).
+    """
+    target = Path(target)
+    # proceso + hilo: dos sesiones del mismo servidor no comparten el temporal
+    tmp = target.with_name(f"{target.stem}.tmp{os.getpid()}-{threading.get_ident()}{target.suffix}")
+    try:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        save(obj, tmp)
+        os.replace(tmp, target)
+    except ARTIFACT_ERRORS:
+        try:
+            tmp.unlink(missing_ok=True)
+        except OSError:
+            pass
+        return False
+    if stale:
+        keep = keep or target.name
+        for old in target.parent.glob(stale):
+            if old != target and not old.name.startswith(keep) and ".tmp" not in old.name:
+                try:
+                    old.unlink(missing_ok=True)
+                except OSError:
+                    pass
+    return True
+
+# Artefactos derivados ya cargados en el proceso, por ruta. Cada ruta tiene su propio
+# RLock (un artefacto puede construirse a partir de otros, p. ej. el paquete EDA usa el
+# de duplicados); _REGISTRY_LOCK solo protege los diccionarios, nunca un build.
+_ARTIFACTS: dict = {}
+_ARTIFACT_LOCKS: dict = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def artifact_lock(target: Path) -> threading.RLock:
+    """Lock de construcción de `target`: serializa solo a quienes piden el mismo artefacto."""
+    with _REGISTRY_LOCK:
+        return _ARTIFACT_LOCKS.setdefault(Path(target), threading.RLock())
+
+def _evict_stale(target: Path, stale: str, keep: str = None) -> None:
+    """Quita de memoria las versiones que save_artifact borraría del disco (mismo `stale`/`keep`)."""
+    keep = keep or target.name
+    with _REGISTRY_LOCK:
+        for old in [t for t in _ARTIFACTS if t != target and t.parent == target.parent
+                    and fnmatch.fnmatch(t.name, stale) and not t.name.startswith(keep)]:
+            del _ARTIFACTS[old]
+            _ARTIFACT_LOCKS.pop(old, None)
+
+def cached_artifact(target: Path, build, load, save, stale: str = None, keep: str = None):
+    """Artefacto derivado con caché en memoria del proceso y en disco.
+
+    Orden: memoria → load(target) → build(). Lo construido se guarda con
+    save_artifact (mismo manejo de errores para todos los artefactos) y queda en
+    memoria aunque no se haya podido escribir. Al guardar una clave nueva se
+    liberan de memoria las versiones anteriores que cubre `stale`.
+    """
+    target = Path(target)
+    obj = _ARTIFACTS.get(target)
+    if obj is not None:
+        return obj
+    with artifact_lock(target):
+        obj = _ARTIFACTS.get(target)  # otro hilo pudo construirlo mientras se esperaba
+        if obj is None:
+            try:
+                obj = load(target)
+            except ARTIFACT_ERRORS:
+                obj = build()
+                save_artifact(obj, target, save, stale, keep)
+            with _REGISTRY_LOCK:
+                _ARTIFACTS[target] = obj
+            if stale:
+                _evict_stale(target, stale, keep)
+    return obj
+
+def _parse_csv(path: str) -> pd.DataFrame:
+    return _coerce_numeric(pd.read_csv(path, low_memory=False))
+
+def _coerce_numeric(df: pd.DataFrame) -> pd.DataFrame:
     df.columns = [c.strip() for c in df.columns]
     # coerción numérica segura en columnas típicas
     for c in [c for c in RELEVANT_NUM if c in df.columns]:
@@ -27,17 +189,474 @@ def load_raw(path: str) -> pd.DataFrame:
         df["Year"] = pd.to_numeric(df["Year"], errors="coerce")
     return df
 
+def _cast_lossless(s: pd.Series, dtype: str) -> pd.Series:
+    try:
+        cast = s.astype(dtype)
+    except (ValueError, TypeError):
+        return s  # p. ej. NaN en una columna entera
+    same = np.array_equal(cast.to_numpy(dtype="float64"), s.to_numpy(dtype="float64"), equal_nan=True)
+    return cast if same else s
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Aplica SCHEMA (categóricas, enteros angostos, float32) y parsea Date con DATE_FORMAT."""
+    out = df.copy()
+    for c, dtype in SCHEMA.items():
+        if c not in out.columns:
+            continue
+        out[c] = out[c].astype("category") if dtype == "category" else _cast_lossless(out[c], dtype)
+    if "Date" in out.columns and not pd.api.types.is_datetime64_any_dtype(out["Date"]):
+        out["Date"] = pd.to_datetime(out["Date"], format=DATE_FORMAT, errors="coerce")
+    return out
+
+def memory_report(before: pd.DataFrame, after: pd.DataFrame) -> pd.DataFrame:
+    """Memoria por columna (memory_usage deep=True) antes y después del esquema compacto."""
+    mb = before.memory_usage(deep=True, index=False) / 1e6
+    ma = after.memory_usage(deep=True, index=False) / 1e6
+    out = pd.DataFrame({
+        "variable": mb.index,
+        "dtype_antes": before.dtypes.astype(str).values,
+        "dtype_despues": after.dtypes.reindex(mb.index).astype(str).values,
+        "MB_antes": mb.values.round(3),
+        "MB_despues": ma.reindex(mb.index).values.round(3),
+    })
+    out["ahorro_%"] = ((1 - out["MB_despues"] / out["MB_antes"]) * 100).round(1)
+    total = pd.DataFrame([{"variable": "TOTAL", "dtype_antes": "", "dtype_despues": "",
+                           "MB_antes": round(mb.sum(), 3), "MB_despues": round(ma.sum(), 3),
+                           "ahorro_%": round((1 - ma.sum() / mb.sum()) * 100, 1)}])
+    return pd.concat([out, total], ignore_index=True)
+
+def schema_memory_report(path: str) -> pd.DataFrame:
+    """memory_report del CSV parseado sin esquema frente a load_raw(path)."""
+    return memory_report(_parse_csv(path), load_raw(path))
+
+def snapshot_path(path: str) -> Path:
+    """Ruta del snapshot columnar (Arrow IPC/Feather) para la versión actual del CSV."""
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{dataset_version(path)[:16]}.v{SNAPSHOT_VERSION}s{SCHEMA_VERSION}.arrow"
+
+def load_raw(path: str, use_cache: bool = True) -> pd.DataFrame:
+    """Carga el CSV con limpieza mínima de nombres y el esquema compacto (SCHEMA).
+
+    Mantiene un snapshot Arrow tipado por versión del CSV: solo se re-parsea el texto
+    cuando cambia el contenido del archivo de origen.
+    """
+    if not use_cache:
+        return apply_schema(_parse_csv(path))
+    snap = snapshot_path(path)
+    # mismo lock por ruta que cached_artifact: una sola sesión parsea y escribe el snapshot
+    with artifact_lock(snap):
+        try:
+            return pd.read_feather(snap)
+        except ARTIFACT_ERRORS:
+            pass  # sin snapshot, ilegible o sin pyarrow: se vuelve al CSV
+        df = apply_schema(_parse_csv(path))
+        stem = Path(path).stem
+        if not save_artifact(df, snap, lambda d, tmp: d.to_feather(tmp, compression="uncompressed"),
+                             stale=f"{stem}.*.v[0-9]*s[0-9]*.arrow"):  # solo snapshots, no cachés derivadas
+            return df
+        # índice de duplicados persistido junto al snapshot (ver DedupIndex)
+        save_artifact(DedupIndex.build(df), dedup_path(path), DedupIndex.save, stale=f"{stem}.*.dedup*.npz")
+        return df
+
+# Marco base por archivo y versión, compartido por todas las sesiones del proceso.
+_DATASETS: dict = {}
+_DATASETS_LOCK = threading.Lock()
+
+def get_dataset(path: str) -> pd.DataFrame:
+    """Vista del dataset compartido por proceso (una sola copia por versión del CSV).
+
+    Cada llamada devuelve una copia superficial copy-on-write: agregar o reemplazar
+    columnas no altera el marco base y los datos solo se duplican si se modifican.
+    """
+    key = str(Path(path).resolve())
+    version = dataset_version(path)
+    with _DATASETS_LOCK:
+        cached = _DATASETS.get(key)
+        if cached is None or cached[0] != version:
+            _DATASETS[key] = (version, load_raw(path))
+        base = _DATASETS[key][1]
+    return base.copy(deep=False)
+
+# ============================
+# Índice de duplicados
+# ============================
+
+# Subir la versión cuando cambie la huella o la clave de bloqueo invalida los índices.
+DEDUP_VERSION = 1
+
+# Abreviaturas de vía tal como aparecen en el dataset (Address: "85 Turner St")
+STREET_ABBREV = {
+    "street": "st", "road": "rd", "avenue": "av", "ave": "av", "lane": "la", "crescent": "cr",
+    "court": "ct", "drive": "dr", "grove": "gr", "parade": "pde", "place": "pl",
+    "terrace": "tce", "close": "cl", "boulevard": "bvd", "highway": "hwy", "circuit": "cct",
+}
+
+def normalize_address(s: pd.Series) -> pd.Series:
+    """Address normalizada: minúsculas, sin puntuación, abreviaturas de vía y "unit 3, 12" → "3/12".
+
+    Se normalizan solo los valores distintos y se expanden por código (factorize).
+    """
+    codes, uniques = pd.factorize(s.astype(object), use_na_sentinel=True)
+    u = pd.Series(uniques, dtype="string").str.lower().str.strip()
+    u = u.str.replace(r"^(?:unit|apt|apartment|flat)\s*(\w+)\s*[,/ ]\s*", r"\1/", regex=True)
+    u = u.str.replace(r"\s*/\s*", "/", regex=True)
+    u = u.str.replace(r"[.,#'\-]", " ", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+    pattern = r"\b(" + "|".join(STREET_ABBREV) + r")\b"
+    u = u.str.replace(pattern, lambda m: STREET_ABBREV[m.group(1)], regex=True)
+    out = pd.Series(pd.NA, index=s.index, dtype="string")
+    out[codes >= 0] = u.to_numpy()[codes[codes >= 0]]
+    return out
+
+def _fingerprint_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # numéricas en float64: el esquema solo angosta sin pérdida, así que el valor
+    # canónico no depende de si el lote quedó en float32/int8 o en float64
+    cols = sorted(df.columns)
+    return pd.DataFrame({c: df[c].astype("float64") if pd.api.types.is_numeric_dtype(df[c]) else df[c]
+                         for c in cols})
+
+def row_fingerprints(df: pd.DataFrame) -> np.ndarray:
+    """Huella uint64 de cada fila completa (hash vectorizado de pandas, sin el índice)."""
+    return pd.util.hash_pandas_object(_fingerprint_frame(df), index=False).to_numpy()
+
+def blocking_keys(df: pd.DataFrame) -> np.ndarray:
+    """Clave uint64 de bloqueo sobre Address + Suburb + Date normalizados (casi-duplicados)."""
+    key = pd.DataFrame({
+        "address": normalize_address(df["Address"]),
+        "suburb": df["Suburb"].astype("string").str.lower().str.strip(),
+        "date": pd.to_datetime(df["Date"], format=DATE_FORMAT, errors="coerce").dt.normalize(),
+    })
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+class DedupIndex:
+    """Huellas de fila y claves de bloqueo de un dataset, para detectar duplicados.
+
+    - Duplicado exacto: misma huella de fila completa.
+    - Posible duplicado: misma clave Address + Suburb + Date con huella distinta
+      (p. ej. el mismo aviso publicado con otro precio o vendedor).
+    Comprobar un lote nuevo son búsquedas en tablas hash, sin comparar marcos.
+    """
+
+    def __init__(self, fingerprints: np.ndarray, blocks: np.ndarray):
+        self.fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        self.blocks = np.asarray(blocks, dtype=np.uint64)
+        self._lookup = None
+
+    @classmethod
+    def build(cls, df: pd.DataFrame) -> "DedupIndex":
+        blocks = blocking_keys(df) if {"Address", "Suburb", "Date"} <= set(df.columns) else \
+            np.zeros(len(df), dtype=np.uint64)
+        return cls(row_fingerprints(df), blocks)
+
+    def duplicated(self) -> np.ndarray:
+        """Como DataFrame.duplicated(): True en cada repetición de una fila ya vista."""
+        return pd.Series(self.fingerprints).duplicated().to_numpy()
+
+    def duplicate_count(self) -> int:
+        return int(self.duplicated().sum())
+
+    def near_duplicates(self) -> pd.DataFrame:
+        """Filas (posición) y grupo de los bloques con más de una huella distinta."""
+        pairs = pd.DataFrame({"bloque": self.blocks, "huella": self.fingerprints})
+        flagged = pairs.groupby("bloque")["huella"].transform("nunique").to_numpy() > 1
+        rows = np.flatnonzero(flagged)
+        group = pd.factorize(self.blocks[rows])[0]
+        return pd.DataFrame({"fila": rows, "grupo": group}).sort_values(["grupo", "fila"], ignore_index=True)
+
+    def check_batch(self, batch: pd.DataFrame) -> pd.DataFrame:
+        """Marca cada fila de un lote (con el mismo esquema, p. ej. vía apply_schema)
+        como duplicado exacto o posible duplicado del índice o de filas previas del lote."""
+        if self._lookup is None:
+            self._lookup = (pd.Index(np.unique(self.fingerprints)), pd.Index(np.unique(self.blocks)))
+        fps, blks = self._lookup
+        other = DedupIndex.build(batch)
+        exact = (fps.get_indexer(other.fingerprints) >= 0) | other.duplicated()
+        near = (blks.get_indexer(other.blocks) >= 0) | pd.Series(other.blocks).duplicated().to_numpy()
+        return pd.DataFrame({"duplicado_exacto": exact, "posible_duplicado": near & ~exact},
+                            index=batch.index)
+
+    def save(self, target: Path) -> None:
+        np.savez(target, fingerprints=self.fingerprints, blocks=self.blocks)
+
+    @classmethod
+    def load(cls, target: Path) -> "DedupIndex":
+        with np.load(target) as z:
+            return cls(z["fingerprints"], z["blocks"])
+
+def dedup_path(path: str) -> Path:
+    """Índice de duplicados asociado al snapshot de la versión actual del CSV."""
+    return snapshot_path(path).with_suffix(f".dedup{DEDUP_VERSION}.npz")
+
+def get_dedup_index(path: str) -> DedupIndex:
+    """DedupIndex de load_raw(path): se lee del disco si el snapshot ya lo guardó."""
+    return cached_artifact(dedup_path(path), lambda: DedupIndex.build(load_raw(path)),
+                           DedupIndex.load, DedupIndex.save,
+                           stale=f"{Path(path).stem}.*.dedup*.npz")
+
 def missing_table(df: pd.DataFrame) -> pd.DataFrame:
-    pct = (df.isna().mean()*100).round(2)
+    return _missing_from_pct(df.isna().mean()*100)
+
+def _missing_from_pct(pct: pd.Series) -> pd.DataFrame:
+    pct = pct.round(2)
     out = (pd.DataFrame({"variable": pct.index, "pct_missing": pct.values})
            .sort_values("pct_missing", ascending=False, ignore_index=True))
     return out
 
+class QuantileSketch:
+    """Sketch de cuantiles fusionable: centroides (valor, peso) ordenados.
+
+    Es exacto mientras haya a lo sumo `max_size` valores distintos; al superarlo se
+    comprime a max_size/2 centroides de igual peso (error de rango ~2/max_size).
+    """
+
+    def __init__(self, max_size: int = 8192):
+        self.max_size = max_size
+        self.values = np.empty(0)
+        self.weights = np.empty(0)
+        self.min = np.inf
+        self.max = -np.inf
+
+    @property
+    def count(self) -> float:
+        return float(self.weights.sum())
+
+    def update(self, x) -> "QuantileSketch":
+        x = np.asarray(x, dtype="float64")
+        x = x[~np.isnan(x)]
+        if x.size:
+            v, w = np.unique(x, return_counts=True)
+            self._absorb(v, w.astype("float64"), v[0], v[-1])
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.values.size:
+            self._absorb(other.values, other.weights, other.min, other.max)
+        return self
+
+    def _absorb(self, v, w, vmin, vmax):
+        self.min, self.max = min(self.min, vmin), max(self.max, vmax)
+        v = np.concatenate([self.values, v])
+        w = np.concatenate([self.weights, w])
+        v, inv = np.unique(v, return_inverse=True)
+        w = np.bincount(inv, weights=w)
+        if v.size > self.max_size:
+            k = self.max_size // 2
+            cum = np.cumsum(w)
+            bucket = np.minimum(((cum - w / 2) / cum[-1] * k).astype(np.int64), k - 1)
+            nw = np.bincount(bucket, weights=w, minlength=k)
+            nv = np.bincount(bucket, weights=w * v, minlength=k)
+            keep = nw > 0
+            v, w = nv[keep] / nw[keep], nw[keep]
+        self.values, self.weights = v, w
+
+    def quantile(self, q):
+        """Cuantil con interpolación lineal entre estadísticos de orden (como pandas)."""
+        q = np.asarray(q, dtype="float64")
+        if not self.values.size:
+            return np.full(q.shape, np.nan)
+        cum = np.cumsum(self.weights)
+        pos = (cum[-1] - 1) * q
+        lo, hi = np.floor(pos), np.ceil(pos)
+        vlo = self.values[np.minimum(np.searchsorted(cum, lo, side="right"), cum.size - 1)]
+        vhi = self.values[np.minimum(np.searchsorted(cum, hi, side="right"), cum.size - 1)]
+        out = vlo + (vhi - vlo) * (pos - lo)
+        out = np.where(q <= 0, self.min, np.where(q >= 1, self.max, out))
+        return out
+
+    def count_outside(self, lower: float, upper: float) -> float:
+        """Cantidad (aprox. si el sketch está comprimido) de valores < lower o > upper."""
+        v, w = self.values, self.weights
+        return float(w[(v < lower) | (v > upper)].sum())
+
+class StreamingProfile:
+    """Perfil de una sola pasada por bloques: nulos, momentos y sketches de cuantiles.
+
+    Produce las mismas tablas que missing_table, describe() y el conteo IQR de outliers
+    sin necesitar el dataset completo en memoria. Las columnas numéricas se fijan con
+    el primer bloque: en los siguientes se convierten con to_numeric, de modo que un
+    bloque con un texto suelto o una columna de texto toda vacía no cambia el conjunto.
+    """
+
+    def __init__(self, max_size: int = 8192):
+        self.max_size = max_size
+        self.num_cols = None
+        self.rows = 0
+        self.nulls = pd.Series(dtype="float64")
+        self.moments = {}   # col -> (n, media, M2)
+        self.sketches = {}  # col -> QuantileSketch
+
+    def update(self, chunk: pd.DataFrame) -> "StreamingProfile":
+        self.rows += len(chunk)
+        self.nulls = self.nulls.add(chunk.isna().sum(), fill_value=0).reindex(
+            self.nulls.index.union(chunk.columns, sort=False))
+        if self.num_cols is None:
+            self.num_cols = list(chunk.select_dtypes(include=[np.number]).columns)
+        num = pd.DataFrame({c: pd.to_numeric(chunk[c], errors="coerce") if c in chunk.columns
+                            else np.nan for c in self.num_cols}, index=chunk.index)
+        X = num.to_numpy(dtype="float64", na_value=np.nan)
+        valid = ~np.isnan(X)
+        n_b = valid.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean_b = np.nansum(X, axis=0) / n_b
+            m2_b = np.nansum((X - mean_b) ** 2, axis=0)
+        for j, col in enumerate(num.columns):
+            n_a, mean_a, m2_a = self.moments.get(col, (0, 0.0, 0.0))
+            n = n_a + n_b[j]
+            if n_b[j]:
+                # combinación de momentos de Chan et al.
+                delta = mean_b[j] - mean_a
+                mean_a = mean_a + delta * n_b[j] / n
+                m2_a = m2_a + m2_b[j] + delta ** 2 * n_a * n_b[j] / n
+            self.moments[col] = (n, mean_a, m2_a)
+            self.sketches.setdefault(col, QuantileSketch(self.max_size)).update(X[valid[:, j], j])
+        return self
+
+    def missing_table(self) -> pd.DataFrame:
+        return _missing_from_pct(self.nulls / self.rows * 100)
+
+    def describe(self) -> pd.DataFrame:
+        rows = {}
+        for col, (n, mean, m2) in self.moments.items():
+            sk = self.sketches[col]
+            q25, q50, q75 = sk.quantile([0.25, 0.5, 0.75]) if n else (np.nan,)*3
+            rows[col] = {"count": float(n), "mean": mean if n else np.nan,
+                         "std": np.sqrt(m2 / (n - 1)) if n > 1 else np.nan,
+                         "min": sk.min if n else np.nan, "25%": q25, "50%": q50,
+                         "75%": q75, "max": sk.max if n else np.nan}
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+    def outliers(self, k: float = 1.5) -> pd.DataFrame:
+        rows = []
+        for col, sk in self.sketches.items():
+            q1, q3 = sk.quantile([0.25, 0.75])
+            iqr = q3 - q1
+            rows.append((col, int(round(sk.count_outside(q1 - k * iqr, q3 + k * iqr)))))
+        return pd.DataFrame(rows, columns=["Variable", "Cantidad de outliers"])
+
+def profile_csv(path: str, chunksize: int = 200_000, max_size: int = 8192) -> StreamingProfile:
+    """Perfila el CSV por bloques de `chunksize` filas sin cargarlo completo.
+
+    Las columnas de texto de SCHEMA se leen siempre como texto: un bloque donde vienen
+    todas vacías no se infiere como float.
+    """
+    prof = StreamingProfile(max_size)
+    text = {c: "object" for c, dtype in SCHEMA.items() if dtype == "category"}
+    for chunk in pd.read_csv(path, chunksize=chunksize, low_memory=False, dtype=text):
+        prof.update(_coerce_numeric(chunk))
+    return prof
+
+# Reglas de outliers y umbral k por defecto. Subir la versión invalida los índices en caché.
+OUTLIER_RULES = {"iqr": 1.5, "mad": 3.5, "zscore": 3.0}
+OUTLIER_VERSION = 1
+
+class OutlierIndex:
+    """Matriz de outliers filas × variables empaquetada en bits (una fila de bytes por variable).
+
+    Los límites de todas las columnas salen de una sola llamada sobre la matriz
+    numérica (nanquantile para IQR, nanmedian para MAD, nanmean/nanstd para z-score).
+    Los conteos son sumas de bits y `mask` combina variables sobre los bytes
+    empaquetados, sin volver a recorrer los datos.
+    """
+
+    def __init__(self, columns, bits: np.ndarray, n_rows: int, lower, upper, rule: str, k: float):
+        self.columns = list(columns)
+        self.bits = bits
+        self.n_rows = int(n_rows)
+        self.lower = np.asarray(lower, dtype="float64")
+        self.upper = np.asarray(upper, dtype="float64")
+        self.rule = rule
+        self.k = float(k)
+
+    @classmethod
+    def build(cls, df: pd.DataFrame, cols=None, rule: str = "iqr", k=None) -> "OutlierIndex":
+        if rule not in OUTLIER_RULES:
+            raise ValueError(f"Regla de outliers desconocida: {rule!r} (opciones: {list(OUTLIER_RULES)})")
+        k = OUTLIER_RULES[rule] if k is None else k
+        cols = list(df.select_dtypes(include=[np.number]).columns) if cols is None else list(cols)
+        X = df[cols].to_numpy(dtype="float64", na_value=np.nan)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # columnas sin datos
+            if rule == "iqr":
+                q1, q3 = np.nanquantile(X, [0.25, 0.75], axis=0)
+                lower, upper = q1 - k * (q3 - q1), q3 + k * (q3 - q1)
+            elif rule == "mad":
+                # puntaje z modificado (Iglewicz-Hoaglin): 0.6745 (x - mediana) / MAD;
+                # con MAD = 0 la regla no discrimina y no marca ninguna fila
+                med = np.nanmedian(X, axis=0)
+                mad = np.nanmedian(np.abs(X - med), axis=0)
+                half = np.where(mad > 0, k * mad / 0.6745, np.inf)
+                lower, upper = med - half, med + half
+            else:
+                mean, std = np.nanmean(X, axis=0), np.nanstd(X, axis=0, ddof=1)
+                lower, upper = mean - k * std, mean + k * std
+        with np.errstate(invalid="ignore"):
+            flags = (X < lower) | (X > upper)  # NaN nunca es outlier
+        return cls(cols, np.packbits(flags.T, axis=1), len(df), lower, upper, rule, k)
+
+    def counts(self) -> pd.Series:
+        return pd.Series(np.bitwise_count(self.bits).sum(axis=1), index=self.columns, dtype="int64")
+
+    def table(self) -> pd.DataFrame:
+        """Conteo por variable (mismas columnas que StreamingProfile.outliers) y límites."""
+        counts = self.counts()
+        return pd.DataFrame({
+            "Variable": self.columns,
+            "Cantidad de outliers": counts.to_numpy(),
+            "% de filas": (counts.to_numpy() / max(self.n_rows, 1) * 100).round(2),
+            "Límite inferior": self.lower,
+            "Límite superior": self.upper,
+        })
+
+    def mask(self, cols=None, how: str = "any") -> np.ndarray:
+        """Máscara booleana por fila: outlier en alguna (any) o en todas (all) las variables."""
+        idx = [self.columns.index(c) for c in (self.columns if cols is None else cols)]
+        if not idx:
+            return np.zeros(self.n_rows, dtype=bool)
+        op = np.bitwise_or if how == "any" else np.bitwise_and
+        packed = op.reduce(self.bits[idx], axis=0)
+        return np.unpackbits(packed, count=self.n_rows).astype(bool)
+
+    def save(self, target: Path) -> None:
+        np.savez(target, bits=self.bits, lower=self.lower, upper=self.upper,
+                 meta=np.array(json.dumps({"columns": self.columns, "n_rows": self.n_rows,
+                                           "rule": self.rule, "k": self.k})))
+
+    @classmethod
+    def load(cls, target: Path) -> "OutlierIndex":
+        with np.load(target) as z:
+            meta = json.loads(str(z["meta"]))
+            return cls(meta["columns"], z["bits"], meta["n_rows"], z["lower"], z["upper"],
+                       meta["rule"], meta["k"])
+
+def outlier_index_path(path: str, rule: str = "iqr", k=None) -> Path:
+    k = OUTLIER_RULES[rule] if k is None else k
+    stem = Path(path).stem
+    return cache_dir(path) / f"{stem}.{cache_key(path)}.outliers.v{OUTLIER_VERSION}.{rule}-{k:g}.npz"
+
+def get_outlier_index(path: str, rule: str = "iqr", k=None) -> OutlierIndex:
+    """Índice de outliers de load_raw(path) por versión del CSV (disco + memoria del proceso).
+
+    Las filas siguen el orden de load_raw/get_dataset, así que la máscara filtra
+    directamente esos marcos (p. ej. df[~idx.mask(["Price"])]).
+    """
+    target = outlier_index_path(path, rule, k)
+    # se limpian otras versiones del CSV o del índice; se conservan las demás reglas
+    return cached_artifact(target, lambda: OutlierIndex.build(load_raw(path), rule=rule, k=k),
+                           OutlierIndex.load, OutlierIndex.save,
+                           stale=f"{Path(path).stem}.*.outliers.*.npz",
+                           keep=target.name.split(f".v{OUTLIER_VERSION}.")[0] + f".v{OUTLIER_VERSION}.")
+
 def skew_stat(s: pd.Series) -> float:
     return s.dropna().skew() if s.notna().any() else 0.0
 
-def imputation_plan(df: pd.DataFrame) -> pd.DataFrame:
-    """Regla por variable, según % faltantes y tipo (siguiendo rúbrica)."""
+# Variables elegibles para la regla espacial KNN (vecinos por Lattitude/Longtitude)
+SPATIAL_COLS = ["BuildingArea", "YearBuilt", "Landsize", "Car"]
+KNN_K = 5
+
+def imputation_plan(df: pd.DataFrame, knn_cols=()) -> pd.DataFrame:
+    """Regla por variable, según % faltantes y tipo (siguiendo rúbrica).
+
+    Las columnas de `knn_cols` usan la regla espacial KNN en lugar de la de su tramo.
+    """
     pct = (df.isna().mean()*100)
     num_cols = df.select_dtypes(include=[np.number]).columns
     plan = []
@@ -46,6 +665,8 @@ def imputation_plan(df: pd.DataFrame) -> pd.DataFrame:
         tipo = "numérico" if col in num_cols else "categórico"
         if p == 0:
             regla = "Sin imputación."
+        elif col in knn_cols and tipo == "numérico":
+            regla = f"Espacial: mediana de los {KNN_K} vecinos más cercanos (Lattitude/Longtitude)."
         elif p <= 5:
             if tipo == "numérico":
                 regla = f"Simple: {'mediana' if abs(skew_stat(df[col]))>1 else 'media'} (según asimetría)."
@@ -59,85 +680,438 @@ def imputation_plan(df: pd.DataFrame) -> pd.DataFrame:
         plan.append((col, tipo, round(p,2), regla))
     return pd.DataFrame(plan, columns=["variable","tipo","% faltantes","decisión"])
 
-def impute_df(df: pd.DataFrame) -> pd.DataFrame:
-    """Imputa según plan: 0–5% simple, 5–30% por grupos; >30% mantener si es clave."""
-    out = df.copy()
+def group_key_for(df: pd.DataFrame):
+    """Clave de grupo del plan: Suburb si existe, en su defecto Regionname."""
+    return "Suburb" if "Suburb" in df.columns else ("Regionname" if "Regionname" in df.columns else None)
+
+def imputation_rules(df: pd.DataFrame, knn_cols=(), all_columns: bool = False) -> dict:
+    """Regla operativa de imputation_plan por columna con faltantes: {col: (ámbito, estadístico)}.
+
+    Ámbitos: "global" (valor único), "grupo" (por group_key_for), "knn" (vecinos
+    espaciales, solo numéricas de `knn_cols`) y "constante" ("Desconocido").
+    Con `all_columns` también reciben regla las columnas completas (la simple del
+    tramo 0–5%), para imputar faltantes que aparezcan en datos posteriores.
+    """
     pct = (df.isna().mean()*100)
     num_cols = df.select_dtypes(include=[np.number]).columns
-    cat_cols = [c for c in df.columns if c not in num_cols]
-    group_key = "Suburb" if "Suburb" in df.columns else ("Regionname" if "Regionname" in df.columns else None)
-
-    # numéricos
-    for col in num_cols:
+    group_key = group_key_for(df)
+    rules = {}
+    for col in df.columns:
         p = float(pct[col])
-        if p == 0: 
+        if p == 0 and not all_columns:
             continue
-        if p <= 5:
-            fillv = out[col].median() if abs(skew_stat(out[col]))>1 else out[col].mean()
-            out[col] = out[col].fillna(fillv)
-        elif p <= 30:
-            if group_key:
-                out[col] = out.groupby(group_key)[col].transform(lambda s: s.fillna(s.median()))
+        by_group = group_key is not None and (p <= 30 or col in KEY_COLS)
+        if col in num_cols:
+            if col in knn_cols:
+                rules[col] = ("knn", "mediana")
+            elif p <= 5:
+                rules[col] = ("global", "mediana" if abs(skew_stat(df[col]))>1 else "media")
             else:
-                out[col] = out[col].fillna(out[col].median())
+                rules[col] = ("grupo", "mediana") if by_group else ("global", "mediana")
         else:
-            if col in KEY_COLS:
-                if group_key:
-                    out[col] = out.groupby(group_key)[col].transform(lambda s: s.fillna(s.median()))
-                else:
-                    out[col] = out[col].fillna(out[col].median())
+            if p <= 5:
+                rules[col] = ("global", "moda")
+            elif by_group:
+                rules[col] = ("grupo", "moda")
+            elif p <= 30 or col in KEY_COLS:
+                rules[col] = ("global", "moda")
             else:
-                out[col] = out[col].fillna(out[col].median())
+                rules[col] = ("constante", "Desconocido")
+    return rules
 
-    # categóricas
-    for col in cat_cols:
-        p = float(pct[col])
-        if p == 0:
+def group_stats(df: pd.DataFrame, key: str, num_cols=(), cat_cols=()) -> dict:
+    """Medianas (numéricas) y modas (categóricas) por valor de `key`: {col: Serie por grupo}.
+
+    Una agregación por tipo de columna; los grupos sin datos quedan en NaN.
+    """
+    codes, uniques = _group_codes(df[key])
+    index = pd.Index(np.asarray(uniques, dtype=object), name=key)
+    out = {}
+    if len(num_cols):
+        for col, v in _group_medians(df, codes, len(uniques), list(num_cols)).items():
+            out[col] = pd.Series(v, index=index, name=col)
+    if len(cat_cols):
+        for col, v in _group_modes(df, codes, len(uniques), list(cat_cols), empty=np.nan).items():
+            out[col] = pd.Series(v, index=index, name=col)
+    return out
+
+def _group_codes(key: pd.Series):
+    return pd.factorize(key, sort=True)
+
+def _group_medians(df: pd.DataFrame, codes: np.ndarray, ngroups: int, cols) -> dict:
+    """Mediana por grupo de todas las columnas en una sola agregación."""
+    med = df[cols].groupby(codes).median().reindex(range(ngroups))
+    return {c: med[c].to_numpy(dtype="float64") for c in cols}
+
+def _group_modes(df: pd.DataFrame, codes: np.ndarray, ngroups: int, cols,
+                 empty="Desconocido") -> dict:
+    """Moda por grupo de varias columnas con un único conteo sobre (columna, grupo, valor).
+
+    Empates: el menor valor, como Series.mode(); grupos sin datos: `empty`.
+    """
+    vcodes, uniques = zip(*[pd.factorize(df[col], sort=True) for col in cols])
+    best = _mode_codes(codes, list(vcodes), ngroups, max(len(u) for u in uniques) + 1)
+    return {col: _decode_modes(best[j], uniques[j], empty) for j, col in enumerate(cols)}
+
+def _mode_codes(codes: np.ndarray, vcodes: list, ngroups: int, nv: int) -> np.ndarray:
+    """Código del valor modal por (columna, grupo), -1 si no hay datos; un solo np.unique."""
+    jj, gg, vv = [], [], []
+    for j, vc in enumerate(vcodes):
+        ok = (vc >= 0) & (codes >= 0)
+        jj.append(np.full(ok.sum(), j, dtype=np.int64))
+        gg.append(codes[ok].astype(np.int64))
+        vv.append(vc[ok].astype(np.int64))
+    keys, counts = np.unique((np.concatenate(jj) * ngroups + np.concatenate(gg)) * nv
+                             + np.concatenate(vv), return_counts=True)
+    jg, v = np.divmod(keys, nv)
+    order = np.lexsort((v, -counts, jg))
+    jg_sorted = jg[order]
+    first = order[np.r_[True, jg_sorted[1:] != jg_sorted[:-1]]]
+    best = np.full(len(vcodes) * ngroups, -1, dtype=np.int64)
+    best[jg[first]] = v[first]
+    return best.reshape(len(vcodes), ngroups)
+
+def _decode_modes(best: np.ndarray, uniques, empty) -> np.ndarray:
+    modes = np.full(len(best), empty, dtype=object)
+    modes[best >= 0] = np.asarray(uniques, dtype=object)[best[best >= 0]]
+    return modes
+
+def _to_shm(arr: np.ndarray) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[:] = arr
+    return shm
+
+def _attach(name: str, n: int, dtype: str):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray((n,), np.dtype(dtype), buffer=shm.buf)
+
+def _shm_group_stat(task) -> np.ndarray:
+    """Worker: estadístico por grupo de una columna leída desde memoria compartida."""
+    stat, n, ngroups, codes_name, col_name, dtype, nv = task
+    shm_codes, codes = _attach(codes_name, n, "int64")
+    shm_col, values = _attach(col_name, n, dtype)
+    try:
+        if stat == "mediana":
+            return pd.Series(values, copy=False).groupby(codes).median().reindex(range(ngroups)).to_numpy("float64")
+        return _mode_codes(codes, [values], ngroups, nv)[0]
+    finally:
+        del codes, values
+        shm_codes.close()
+        shm_col.close()
+
+def _parallel_group_stats(df: pd.DataFrame, codes: np.ndarray, ngroups: int, cols, stat: str,
+                          n_jobs: int, empty="Desconocido") -> dict:
+    """Mediana o moda por grupo de cada columna en un pool de procesos.
+
+    Los códigos de grupo y cada columna se copian una vez a memoria compartida; los
+    workers los leen sin serializar marcos y devuelven solo un valor por grupo.
+    """
+    blocks = [_to_shm(codes.astype(np.int64))]
+    try:
+        tasks, uniques = [], {}
+        for col in cols:
+            if stat == "mediana":
+                arr, nv = df[col].to_numpy(), 0
+            else:
+                arr, uniques[col] = pd.factorize(df[col], sort=True)
+                arr, nv = arr.astype(np.int64), len(uniques[col]) + 1
+            blocks.append(_to_shm(arr))
+            tasks.append((stat, len(codes), ngroups, blocks[0].name, blocks[-1].name, arr.dtype.str, nv))
+        # "spawn" y no fork: el proceso de Streamlit tiene hilos en ejecución
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(tasks)),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(_shm_group_stat, tasks))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    if stat == "mediana":
+        return dict(zip(cols, results))
+    return {col: _decode_modes(best, uniques[col], empty) for col, best in zip(cols, results)}
+
+def _fill_by_group(s: pd.Series, stats: np.ndarray, codes: np.ndarray) -> pd.Series:
+    """Rellena NaN con el estadístico de su grupo; como groupby.transform, sin clave -> NaN."""
+    fill = np.append(stats, np.array([np.nan], dtype=stats.dtype))[codes]
+    return s.fillna(pd.Series(fill, index=s.index)).where(codes >= 0)
+
+def _flush_group_modes(out: pd.DataFrame, group_key: str, cols: list, n_jobs=None):
+    if cols:
+        codes, uniques = _group_codes(out[group_key])
+        if n_jobs and n_jobs > 1:
+            modes = _parallel_group_stats(out, codes, len(uniques), cols, "moda", n_jobs)
+        else:
+            modes = _group_modes(out, codes, len(uniques), cols)
+        for col in cols:
+            out[col] = _fill_by_group(out[col], modes[col], codes)
+        cols.clear()
+
+# Jerarquía espacial para resolver faltantes, de la más local a la más general
+HIER_LEVELS = ["Suburb", "Postcode", "CouncilArea", "Regionname"]
+
+def hierarchical_stats(df: pd.DataFrame, cols, levels=HIER_LEVELS) -> dict:
+    """Tabla de medianas/modas por nivel ({nivel: {col: Serie}}) más el nivel "global".
+
+    Una agregación por nivel y tipo de columna, calculada una sola vez.
+    """
+    num = [c for c in cols if pd.api.types.is_numeric_dtype(df[c])]
+    cat = [c for c in cols if c not in num]
+    stats = {lvl: group_stats(df, lvl, num, cat) for lvl in levels if lvl in df.columns}
+    glob = {}
+    for c in num:
+        glob[c] = df[c].median()
+    for c in cat:
+        m = df[c].mode(dropna=True)
+        glob[c] = m.iloc[0] if not m.empty else np.nan
+    stats["global"] = glob
+    return stats
+
+def impute_hierarchical(df: pd.DataFrame, cols=None, levels=HIER_LEVELS, stats=None):
+    """Imputa por la jerarquía Suburb → Postcode → CouncilArea → Regionname → global.
+
+    Cada celda faltante toma el primer estadístico disponible (coalescencia vectorizada
+    sobre las tablas de hierarchical_stats). Devuelve (df imputado, linaje): el linaje
+    es categórico por celda con el nivel que la completó (NaN si el dato era observado).
+    """
+    cols = [c for c in (cols if cols is not None else df.columns) if df[c].isna().any()]
+    levels = [lvl for lvl in levels if lvl in df.columns]
+    stats = stats if stats is not None else hierarchical_stats(df, cols, levels)
+    names = levels + ["global", "sin_resolver"]
+    out = df.copy(deep=False)
+    lineage = {}
+    for col in cols:
+        missing = out[col].isna().to_numpy()
+        cands = [df[lvl].astype(object).map(stats[lvl][col]).to_numpy(dtype=object)[missing]
+                 for lvl in levels]
+        cands.append(np.full(missing.sum(), stats["global"][col], dtype=object))
+        cand = np.column_stack(cands)
+        found = ~pd.isna(cand)
+        first = np.where(found.any(axis=1), found.argmax(axis=1), len(names) - 1)
+        fill = np.full(len(out), np.nan, dtype=object)
+        fill[missing] = np.append(cand, np.full((len(cand), 1), np.nan, dtype=object),
+                                  axis=1)[np.arange(len(cand)), first]
+        values = pd.Series(fill, index=out.index)
+        if pd.api.types.is_numeric_dtype(out[col]):
+            values = values.astype("float64")
+        elif isinstance(out[col].dtype, pd.CategoricalDtype):
+            new = [v for v in values.dropna().unique() if v not in out[col].cat.categories]
+            out[col] = out[col].cat.add_categories(new)
+        out[col] = out[col].fillna(values)
+        codes = np.full(len(out), -1, dtype=np.int8)
+        codes[missing] = first
+        lineage[col] = pd.Categorical.from_codes(codes, categories=names)
+    return out, pd.DataFrame(lineage, index=df.index)
+
+def lineage_summary(lineage: pd.DataFrame) -> pd.DataFrame:
+    """Celdas completadas por variable y nivel de la jerarquía."""
+    return lineage.apply(lambda s: s.value_counts(sort=False)).T
+
+def impute_knn(df: pd.DataFrame, cols=SPATIAL_COLS, k: int = KNN_K,
+               coords=("Lattitude", "Longtitude")) -> pd.DataFrame:
+    """Imputa `cols` con la mediana de los k vecinos más cercanos que tienen dato.
+
+    Por columna se construye un KD-tree sobre las coordenadas (proyectadas a km) de
+    las filas con dato y se consulta en lote para todas las filas faltantes. Las
+    filas sin coordenadas quedan en NaN.
+    """
+    out = df.copy(deep=False)
+    cols = [c for c in cols if c in df.columns and df[c].isna().any()]
+    lat = df[coords[0]].to_numpy(dtype="float64")
+    lon = df[coords[1]].to_numpy(dtype="float64")
+    has_xy = ~(np.isnan(lat) | np.isnan(lon))
+    if not cols or not has_xy.any():
+        return out
+    # proyección equirectangular local: distancias euclidianas ~ km
+    xy = np.column_stack([lon * 111.32 * np.cos(np.radians(np.nanmean(lat))), lat * 110.57])
+    for col in cols:
+        values = df[col].to_numpy(dtype="float64")
+        known = ~np.isnan(values)
+        donors = np.flatnonzero(has_xy & known)
+        targets = np.flatnonzero(has_xy & ~known)
+        if not len(donors) or not len(targets):
             continue
-        if p <= 5:
+        _, idx = cKDTree(xy[donors]).query(xy[targets], k=min(k, len(donors)), workers=-1)
+        filled = values.copy()
+        filled[targets] = np.median(values[donors[idx.reshape(len(targets), -1)]], axis=1)
+        out[col] = pd.Series(filled, index=df.index).astype(df[col].dtype)
+    return out
+
+def impute_df(df: pd.DataFrame, knn_cols=(), k: int = KNN_K, n_jobs=None, fallback=True,
+              return_lineage: bool = False):
+    """Imputa según plan: 0–5% simple, 5–30% por grupos; >30% mantener si es clave.
+
+    Las medianas y modas por grupo de todas las columnas se calculan en una sola
+    agregación y se rellenan por código de grupo, sin funciones Python por grupo.
+    Las numéricas de `knn_cols` se imputan con impute_knn (regla espacial).
+    Con `n_jobs` > 1 los estadísticos por grupo se reparten por columna en un pool
+    de procesos con buffers en memoria compartida; el resultado es idéntico.
+    Con `fallback` los faltantes que dejan los grupos sin ningún dato observado se
+    completan al final con impute_hierarchical (Suburb → … → global); con
+    `return_lineage` devuelve (df, linaje de ese paso final).
+    """
+    out = df.copy(deep=False)  # copy-on-write: solo se duplican las columnas imputadas
+    rules = imputation_rules(df, knn_cols)
+    knn = [c for c, (scope, _) in rules.items() if scope == "knn"]
+    if knn:
+        out = impute_knn(out, knn, k)
+    num_cols = df.select_dtypes(include=[np.number]).columns
+    group_key = group_key_for(df)
+
+    # numéricos
+    num_group = []
+    for col in [c for c in num_cols if c in rules]:
+        scope, stat = rules[col]
+        if scope == "knn":
+            continue
+        if scope == "grupo":
+            num_group.append(col)
+        else:
+            out[col] = out[col].fillna(out[col].median() if stat == "mediana" else out[col].mean())
+    if num_group:
+        codes, uniques = _group_codes(out[group_key])
+        if n_jobs and n_jobs > 1:
+            med = _parallel_group_stats(out, codes, len(uniques), num_group, "mediana", n_jobs)
+        else:
+            med = _group_medians(out, codes, len(uniques), num_group)
+        for col in num_group:
+            out[col] = _fill_by_group(out[col], med[col], codes)
+
+    # categóricas: las modas por grupo se acumulan y se resuelven juntas; si la propia
+    # clave de grupo se imputa, las columnas anteriores usan la clave sin imputar
+    pending, added = [], []
+    for col in [c for c in df.columns if c in rules and c not in num_cols]:
+        scope, stat = rules[col]
+        if col == group_key:
+            _flush_group_modes(out, group_key, pending, n_jobs)
+        if isinstance(out[col].dtype, pd.CategoricalDtype) and "Desconocido" not in out[col].cat.categories:
+            out[col] = out[col].cat.add_categories(["Desconocido"])
+            added.append(col)
+        if scope == "grupo":
+            pending.append(col)
+        elif scope == "global":
             m = out[col].mode(dropna=True)
             out[col] = out[col].fillna(m.iloc[0] if not m.empty else "Desconocido")
-        elif p <= 30:
-            if group_key:
-                def _fill(s):
-                    m = s.mode(dropna=True)
-                    return s.fillna(m.iloc[0] if not m.empty else "Desconocido")
-                out[col] = out.groupby(group_key)[col].transform(_fill)
-            else:
-                m = out[col].mode(dropna=True)
-                out[col] = out[col].fillna(m.iloc[0] if not m.empty else "Desconocido")
         else:
-            if col in KEY_COLS:
-                if group_key:
-                    def _fill(s):
-                        m = s.mode(dropna=True)
-                        return s.fillna(m.iloc[0] if not m.empty else "Desconocido")
-                    out[col] = out.groupby(group_key)[col].transform(_fill)
-                else:
-                    m = out[col].mode(dropna=True)
-                    out[col] = out[col].fillna(m.iloc[0] if not m.empty else "Desconocido")
-            else:
-                out[col] = out[col].fillna("Desconocido")
+            out[col] = out[col].fillna("Desconocido")
+    _flush_group_modes(out, group_key, pending, n_jobs)
+    for col in added:
+        if not (out[col] == "Desconocido").any():
+            out[col] = out[col].cat.remove_categories(["Desconocido"])
 
-    return out
+    # respaldo jerárquico: solo columnas del plan que aún tienen faltantes
+    residual = [c for c in rules if out[c].isna().any()]
+    lineage = pd.DataFrame(index=out.index)
+    if fallback and residual:
+        out, lineage = impute_hierarchical(out, cols=residual)
+    return (out, lineage) if return_lineage else out
+
+# Caché del dataset imputado: la clave es (hash del CSV, plan). Subir la versión
+# cuando cambien las reglas o el código de imputación invalida lo ya guardado.
+IMPUTATION_VERSION = 2
+
+def imputation_key(knn_cols=(), k: int = KNN_K) -> str:
+    """Hash corto del plan de imputación (versión de reglas, columnas KNN y k)."""
+    spec = {"version": IMPUTATION_VERSION, "knn_cols": sorted(knn_cols), "k": k if knn_cols else None}
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+def imputed_path(path: str, knn_cols=(), k: int = KNN_K) -> Path:
+    """Ruta del dataset imputado en caché para la versión actual del CSV y el plan dado."""
+    return cache_dir(path) / "imputed" / f"{Path(path).stem}.{cache_key(path)}.{imputation_key(knn_cols, k)}.arrow"
+
+def lineage_path(path: str, knn_cols=(), k: int = KNN_K) -> Path:
+    """Linaje del respaldo jerárquico, guardado junto al dataset imputado del mismo plan."""
+    return imputed_path(path, knn_cols, k).with_suffix(".linaje.arrow")
+
+def load_imputed(path: str, knn_cols=(), k: int = KNN_K, n_jobs=None) -> pd.DataFrame:
+    """impute_df(load_raw(path)) con caché en disco direccionada por contenido.
+
+    Solo se imputa la primera vez para cada (versión del CSV, plan); el resto de
+    páginas, sesiones y scripts leen el snapshot Arrow ya imputado. Devuelve el
+    marco compartido del proceso: para modificarlo, usar get_imputed.
+    """
+    target = imputed_path(path, knn_cols, k)
+
+    def build():
+        df, lineage = impute_df(load_raw(path), knn_cols=knn_cols, k=k, n_jobs=n_jobs, return_lineage=True)
+        # linaje persistido junto al dataset imputado (ver get_imputation_lineage)
+        save_artifact(lineage, lineage_path(path, knn_cols, k), lambda l, tmp: l.to_feather(tmp))
+        return df
+
+    # se limpian imputaciones (y linajes) de versiones anteriores del CSV; se conservan otros planes
+    return cached_artifact(target, build, pd.read_feather,
+                           lambda df, tmp: df.to_feather(tmp, compression="uncompressed"),
+                           stale=f"{Path(path).stem}.*.arrow", keep=target.name.rsplit(".", 2)[0] + ".")
+
+def get_imputation_lineage(path: str, knn_cols=(), k: int = KNN_K) -> pd.DataFrame:
+    """Linaje por celda del respaldo jerárquico de load_imputed (ver impute_hierarchical).
+
+    Se lee del disco si la imputación ya lo guardó; solo se recalcula si falta.
+    """
+    return cached_artifact(lineage_path(path, knn_cols, k),
+                           lambda: impute_df(load_raw(path), knn_cols=knn_cols, k=k, return_lineage=True)[1],
+                           pd.read_feather, lambda l, tmp: l.to_feather(tmp))
+
+def get_imputed(path: str, knn_cols=(), k: int = KNN_K) -> pd.DataFrame:
+    """Vista compartida por proceso del dataset imputado (ver get_dataset)."""
+    return load_imputed(path, knn_cols, k).copy(deep=False)
+
+DRIFT_QUANTILES = [0.05, 0.25, 0.75, 0.95]
+
+def _sorted_columns(df: pd.DataFrame, cols):
+    """Una fila contigua por columna, ordenada (NaN al final), y su conteo de válidos.
+
+    Base común de momentos, cuantiles y KS.
+    """
+    X = np.array(df[cols].to_numpy(dtype="float64", na_value=np.nan).T, order="C")
+    X.sort(axis=1)
+    return X, (~np.isnan(X)).sum(axis=1)
+
+def _quantiles_sorted(S: np.ndarray, n: np.ndarray, qs) -> np.ndarray:
+    """Cuantiles (interpolación lineal, como pandas) por fila de `S`; devuelve (len(qs), filas)."""
+    pos = (np.maximum(n, 1) - 1)[:, None] * np.asarray(qs, dtype="float64")[None, :]
+    lo, hi = np.floor(pos).astype(np.int64), np.ceil(pos).astype(np.int64)
+    vlo = np.take_along_axis(S, lo, axis=1)
+    vhi = np.take_along_axis(S, hi, axis=1)
+    return np.where(n[:, None] > 0, vlo + (vhi - vlo) * (pos - lo), np.nan).T
+
+def ks_statistic(a: np.ndarray, b: np.ndarray) -> float:
+    """Estadístico KS de dos muestras a partir de arreglos ya ordenados y sin NaN."""
+    if not len(a) or not len(b):
+        return np.nan
+    # el máximo de |Fa - Fb| se alcanza en algún valor distinto de a o de b; al estar
+    # ordenadas, los distintos salen sin volver a ordenar
+    d = 0.0
+    for x in (a, b):
+        grid = x[np.r_[x[1:] != x[:-1], True]]
+        fa = np.searchsorted(a, grid, side="right") / len(a)
+        fb = np.searchsorted(b, grid, side="right") / len(b)
+        d = max(d, float(np.abs(fa - fb).max()))
+    return d
 
 def compare_distributions(df_before: pd.DataFrame, df_after: pd.DataFrame) -> pd.DataFrame:
-    """Comparativa simple antes/después: media, mediana y desviación estándar por variable numérica."""
-    num_cols = df_after.select_dtypes(include=[np.number]).columns
-    rows = []
-    for col in num_cols:
-        b = df_before[col].dropna()
-        a = df_after[col].dropna()
-        rows.append({
-            "variable": col,
-            "media_antes": b.mean() if len(b)>0 else np.nan,
-            "media_despues": a.mean() if len(a)>0 else np.nan,
-            "mediana_antes": b.median() if len(b)>0 else np.nan,
-            "mediana_despues": a.median() if len(a)>0 else np.nan,
-            "std_antes": b.std(ddof=1) if len(b)>1 else np.nan,
-            "std_despues": a.std(ddof=1) if len(a)>1 else np.nan,
-        })
-    comp = pd.DataFrame(rows)
+    """Comparativa antes/después por variable numérica: momentos, deltas de cuantiles y KS.
+
+    Cada marco se ordena una sola vez por variable; medias, desviaciones, cuantiles
+    (p5/p25/p50/p75/p95) y el estadístico KS salen de esas columnas ordenadas.
+    """
+    num_cols = [c for c in df_after.select_dtypes(include=[np.number]).columns if c in df_before.columns]
+    Sb, nb = _sorted_columns(df_before, num_cols)
+    Sa, na = _sorted_columns(df_after, num_cols)
+    with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mean_b, mean_a = np.nanmean(Sb, axis=1), np.nanmean(Sa, axis=1)
+        std_b = np.where(nb > 1, np.nanstd(Sb, axis=1, ddof=1), np.nan)
+        std_a = np.where(na > 1, np.nanstd(Sa, axis=1, ddof=1), np.nan)
+    qs = [0.5] + DRIFT_QUANTILES
+    qb, qa = _quantiles_sorted(Sb, nb, qs), _quantiles_sorted(Sa, na, qs)
+    comp = pd.DataFrame({
+        "variable": num_cols,
+        "media_antes": mean_b, "media_despues": mean_a,
+        "mediana_antes": qb[0], "mediana_despues": qa[0],
+        "std_antes": std_b, "std_despues": std_a,
+    })
     comp["delta_media"] = comp["media_despues"] - comp["media_antes"]
     comp["delta_mediana"] = comp["mediana_despues"] - comp["mediana_antes"]
+    for i, q in enumerate(DRIFT_QUANTILES, start=1):
+        comp[f"delta_p{int(q*100):02d}"] = qa[i] - qb[i]
+    comp["ks"] = [ks_statistic(Sb[j, :nb[j]], Sa[j, :na[j]]) for j in range(len(num_cols))]
     return comp
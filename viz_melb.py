@@ -0,0 +1,145 @@
+"""
+Capa de visualización del lado del servidor (Melbourne Housing).
+
+Los histogramas se agrupan con NumPy y a Plotly solo se envían las barras
+(bordes y conteos): la carga útil hacia el navegador es O(bins), no O(filas).
+Las dispersiones usan WebGL para marcos pequeños y, por encima de
+SCATTER_WEBGL_MAX puntos, una grilla de densidad 2D con color logarítmico.
+"""
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+BIN_SCALES = ["fija", "log", "cuantiles"]
+
+
+def _values(x) -> np.ndarray:
+    x = pd.Series(x).to_numpy(dtype="float64", na_value=np.nan)
+    return x[np.isfinite(x)]
+
+
+def bin_edges(x, bins: int = 30, scale: str = "fija") -> np.ndarray:
+    """Bordes de `bins` intervalos: ancho fijo, logarítmicos (valores > 0) o por cuantiles."""
+    x = _values(x)
+    if scale == "log":
+        x = x[x > 0]
+    if not len(x):
+        return np.array([0.0, 1.0])
+    lo, hi = float(x.min()), float(x.max())
+    if lo == hi:
+        return np.array([lo - 0.5, hi + 0.5])
+    if scale == "fija":
+        return np.linspace(lo, hi, bins + 1)
+    if scale == "log":
+        return np.geomspace(lo, hi, bins + 1)
+    if scale == "cuantiles":
+        # bordes repetidos (valores muy frecuentes) se colapsan en un solo intervalo
+        return np.unique(np.quantile(x, np.linspace(0, 1, bins + 1)))
+    raise ValueError(f"Escala de bins desconocida: {scale!r} (opciones: {BIN_SCALES})")
+
+
+def bin_counts(x, bins: int = 30, scale: str = "fija", edges=None) -> dict:
+    """{"edges", "counts", "scale"} listos para serializar; `edges` fija los bordes (p. ej. para comparar)."""
+    edges = bin_edges(x, bins, scale) if edges is None else np.asarray(edges, dtype="float64")
+    counts, _ = np.histogram(_values(x), bins=edges)
+    return {"edges": edges.tolist(), "counts": counts.tolist(), "scale": scale}
+
+
+def histogram_figure(hists, title: str = "", x_title: str = "", colors=None, names=None) -> go.Figure:
+    """Figura de barras a partir de uno o varios resultados de bin_counts (superpuestos).
+
+    Con bins por cuantiles la altura es la densidad (conteo / ancho), para que las
+    barras de distinto ancho sean comparables; con escala log el eje x es logarítmico.
+    """
+    hists = [hists] if isinstance(hists, dict) else list(hists)
+    fig = go.Figure()
+    for i, h in enumerate(hists):
+        edges = np.asarray(h["edges"], dtype="float64")
+        counts = np.asarray(h["counts"], dtype="float64")
+        scale = h.get("scale", "fija")
+        if scale == "log":
+            # en eje log las barras se dibujan sobre log10(x) con marcas en valores reales
+            edges = np.log10(edges)
+        y = counts / np.diff(edges) if scale == "cuantiles" else counts
+        fig.add_trace(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2, y=y, width=np.diff(edges),
+            name=names[i] if names else None,
+            marker_color=colors[i % len(colors)] if colors else None,
+            opacity=0.6 if len(hists) > 1 else 1.0,
+        ))
+    scale = hists[0].get("scale", "fija") if hists else "fija"
+    fig.update_layout(title=title, bargap=0.02, barmode="overlay", showlegend=bool(names),
+                      xaxis_title=x_title, yaxis_title="densidad" if scale == "cuantiles" else "count")
+    if scale == "log" and hists:
+        lo, hi = np.log10(hists[0]["edges"][0]), np.log10(hists[0]["edges"][-1])
+        ticks = np.arange(np.floor(lo), np.ceil(hi) + 1)
+        fig.update_xaxes(tickvals=ticks, ticktext=[f"{10 ** t:,.0f}" if t >= 0 else f"{10 ** t:g}" for t in ticks])
+    return fig
+
+
+# ============================
+# Dispersión: puntos WebGL o densidad 2D
+# ============================
+
+SCATTER_WEBGL_MAX = 20_000  # por encima se agrega en bins 2D en lugar de enviar puntos
+DENSITY_BINS = 80
+
+
+def _pairs(x, y):
+    x = pd.Series(x).to_numpy(dtype="float64", na_value=np.nan)
+    y = pd.Series(y).to_numpy(dtype="float64", na_value=np.nan)
+    ok = np.isfinite(x) & np.isfinite(y)
+    return x[ok], y[ok]
+
+
+def _centers(edges) -> np.ndarray:
+    edges = np.asarray(edges, dtype="float64")
+    return (edges[:-1] + edges[1:]) / 2
+
+
+def bin_2d(x, y, bins: int = DENSITY_BINS) -> dict:
+    """Conteos en una grilla bins × bins de los pares (x, y) completos, serializables."""
+    x, y = _pairs(x, y)
+    if not len(x):
+        return {"x_edges": [0.0, 1.0], "y_edges": [0.0, 1.0], "counts": [[0]], "n": 0}
+    counts, xe, ye = np.histogram2d(x, y, bins=bins)
+    return {"x_edges": xe.tolist(), "y_edges": ye.tolist(),
+            "counts": counts.astype(np.int64).tolist(), "n": int(len(x))}
+
+
+def density_figure(b: dict, title: str = "", x_title: str = "", y_title: str = "",
+                   colorscale="Blues") -> go.Figure:
+    """Mapa de calor de bin_2d con color en escala log10 (celdas vacías en blanco)."""
+    z = np.asarray(b["counts"], dtype="float64").T  # filas = y
+    with np.errstate(divide="ignore"):
+        zlog = np.where(z > 0, np.log10(z), np.nan)
+    top = max(1, int(np.ceil(np.nanmax(zlog)))) if (z > 0).any() else 1
+    ticks = np.arange(0, top + 1)
+    fig = go.Figure(go.Heatmap(
+        x=_centers(b["x_edges"]), y=_centers(b["y_edges"]), z=zlog, customdata=z,
+        zmin=0, zmax=top, colorscale=colorscale,
+        colorbar=dict(title="casos", tickvals=ticks, ticktext=[f"{10 ** t:,.0f}" for t in ticks]),
+        hovertemplate=f"{x_title}=%{{x:,.4g}}<br>{y_title}=%{{y:,.4g}}<br>casos=%{{customdata:,.0f}}<extra></extra>",
+    ))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+def points_figure(x, y, title: str = "", x_title: str = "", y_title: str = "",
+                  color=None, opacity: float = 0.4) -> go.Figure:
+    """Dispersión de puntos con WebGL (Scattergl)."""
+    x, y = _pairs(x, y)
+    fig = go.Figure(go.Scattergl(x=x, y=y, mode="markers",
+                                 marker=dict(color=color, opacity=opacity, size=5)))
+    fig.update_layout(title=title, xaxis_title=x_title, yaxis_title=y_title)
+    return fig
+
+
+def scatter_figure(x, y, title: str = "", x_title: str = "", y_title: str = "", color=None,
+                   colorscale="Blues", max_points: int = SCATTER_WEBGL_MAX) -> go.Figure:
+    """Puntos WebGL hasta `max_points` pares completos; por encima, densidad 2D en log."""
+    x, y = _pairs(x, y)
+    if len(x) <= max_points:
+        return points_figure(x, y, title, x_title, y_title, color=color)
+    return density_figure(bin_2d(x, y), title, x_title, y_title, colorscale=colorscale)